@@ -0,0 +1,163 @@
+import argparse
+import importlib
+import json
+import math
+import os
+import platform
+import time
+from prettytable import PrettyTable # type: ignore
+
+defs = importlib.import_module("2005089_aes_defs")
+parallel = importlib.import_module("2005089_aes_parallel")
+
+# AES throughput benchmark: key schedule, single block, CBC encrypt/decrypt,
+# CTR and GCM for every available engine over a range of payload sizes.
+#
+#   python 2005089_aes_benchmark.py --json aes_bench.json
+#   python 2005089_aes_benchmark.py --engines numpy --sizes 1M 64M --trials 10
+
+default_sizes = ["16", "1K", "64K", "1M", "16M", "64M"]
+
+# Largest payload each engine is run on by default; the reference rounds
+# would need most of an hour for 64 MB
+engine_limits = {"reference": 64 << 10, "ttable": 4 << 20, "numpy": 64 << 20, "bitslice": 64 << 20}
+
+# Operations each batch engine really batches; the rest run on the T-tables
+# and get the ttable limit
+batched_operations = {"numpy": ("cbc_decrypt", "ctr", "gcm"), "bitslice": ("ctr", "gcm")}
+
+operations = ("key_schedule", "single_block", "cbc_encrypt", "cbc_decrypt", "ctr", "gcm")
+
+def parse_size(text):
+    units = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+    text = text.strip().upper().rstrip("B")
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+def format_size(size):
+    for unit, scale in (("M", 1 << 20), ("K", 1 << 10)):
+        if size >= scale and size % scale == 0:
+            return f"{size // scale}{unit}B"
+    return f"{size}B"
+
+# Nearest-rank percentile of an already sorted list
+def percentile(sorted_values, pct):
+    return sorted_values[max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)]
+
+# What AES(key, engine) costs for a key it has not seen (the LRU is cleared)
+def key_schedule_op(key, engine):
+    def run():
+        defs.get_key_schedule.cache_clear()
+        defs.AES(key, engine)
+    return run
+
+# (operation callable, payload bytes) for one benchmark case
+def build_case(operation, engine, size, workers):
+    key = os.urandom(16)
+    iv = int.from_bytes(os.urandom(16), 'big')
+    cipher = defs.AES(key, engine, workers)
+    if operation == "key_schedule":
+        return key_schedule_op(key, engine), 16
+    if operation == "single_block":
+        block = os.urandom(16)
+        return (lambda: cipher.encrypt_block(block)), 16
+    data = os.urandom(size)
+    if operation == "cbc_encrypt":
+        return (lambda: cipher.encrypt_cbc(data, iv)), size
+    if operation == "cbc_decrypt":
+        # Padding is not checked, so any whole-block ciphertext will do
+        ciphertext = os.urandom((size + 15) // 16 * 16)
+        return (lambda: cipher.decrypt_cbc(ciphertext, iv, unpad=False)), size
+    if operation == "gcm":
+        nonce = iv >> 32
+        return (lambda: cipher.encrypt_gcm(data, nonce)), size
+    return (lambda: cipher.encrypt_ctr(data, iv)), size
+
+def run_case(func, payload, warmup, trials):
+    for _ in range(warmup):
+        func()
+    times = []
+    for _ in range(trials):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    times.sort()
+    p50 = percentile(times, 50)
+    return {
+        "bytes": payload,
+        "trials": trials,
+        "mb_per_s": payload / p50 / 1e6,
+        "blocks_per_s": ((payload + 15) // 16) / p50,
+        "mean_ms": sum(times) / len(times) * 1000,
+        "p50_ms": p50 * 1000,
+        "p95_ms": percentile(times, 95) * 1000,
+    }
+
+def size_limit(engine, operation, limits):
+    if engine in batched_operations and operation not in batched_operations[engine]:
+        engine = "ttable"
+    return limits.get(engine)
+
+def run_benchmarks(engines, sizes, warmup=1, trials=5, workers=1, limits=engine_limits, log=print):
+    results = []
+    for engine in engines:
+        for operation in operations:
+            case_sizes = [16] if operation in ("key_schedule", "single_block") else sizes
+            for size in case_sizes:
+                limit = size_limit(engine, operation, limits)
+                if limit is not None and size > limit:
+                    continue
+                func, payload = build_case(operation, engine, size, workers)
+                result = run_case(func, payload, warmup, trials)
+                result.update(engine=engine, operation=operation, size=format_size(size), workers=workers)
+                results.append(result)
+                if log:
+                    log(f"  {engine:>9} {operation:<13} {format_size(size):>6}: {result['mb_per_s']:10.3f} MB/s")
+    return results
+
+def results_table(results):
+    table = PrettyTable()
+    table.field_names = ["Engine", "Operation", "Size", "MB/s", "Blocks/s", "p50 (ms)", "p95 (ms)"]
+    for r in results:
+        table.add_row([
+            r["engine"], r["operation"], r["size"],
+            round(r["mb_per_s"], 3), round(r["blocks_per_s"]),
+            round(r["p50_ms"], 4), round(r["p95_ms"], 4),
+        ])
+    return table
+
+def machine_info():
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="AES engine / mode throughput benchmark")
+    parser.add_argument("--engines", nargs="+", default=list(parallel.engines), choices=list(defs.engines))
+    parser.add_argument("--sizes", nargs="+", default=default_sizes, help="payload sizes, e.g. 16 1K 1M 64M")
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--trials", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=1, help="process pool size for CTR / CBC decryption")
+    parser.add_argument("--no-limits", action="store_true", help="run every engine on every size")
+    parser.add_argument("--json", help="write machine-readable results to this file")
+    args = parser.parse_args()
+
+    sizes = sorted(parse_size(s) for s in args.sizes)
+    limits = {} if args.no_limits else engine_limits
+    print("=== AES Benchmark ===")
+    results = run_benchmarks(args.engines, sizes, args.warmup, args.trials, args.workers, limits)
+
+    print("\n=== Results ===")
+    print(results_table(results))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"machine": machine_info(), "results": results}, f, indent=2)
+        print(f"\nJSON written to: {args.json}")
+
+if __name__ == "__main__":
+    main()
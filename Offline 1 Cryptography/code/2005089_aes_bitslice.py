@@ -0,0 +1,201 @@
+import functools
+import importlib
+ttable = importlib.import_module('2005089_aes_ttable')
+
+# Bitsliced engine over Python ints, no NumPy needed. A batch of n blocks is
+# held as state[p][i] for byte p = 0..15 and bit i = 0..7 (0 = MSB), where
+# bit k of the int is that bit of byte p of block k. Every gate then works on
+# all n blocks at once:
+#   SubBytes   - Boyar-Peralta S-box circuit (32 AND + 83 XOR/XNOR)
+#   ShiftRows  - reordering the 16 byte lists
+#   MixColumns - XORs plus a bitsliced xtime, along the rows like mix_column
+#   AddRoundKey - XOR with all-ones where the key bit is set
+# Only encryption is provided; it is used for the CTR keystream.
+
+# Blocks per batch; each state int is batch_blocks / 8 bytes
+batch_blocks = 1 << 16
+# A round costs the same ~2400 int operations for any batch size, so short
+# keystreams are cheaper one block at a time on the T-tables
+min_batch = 64
+
+def sub_byte(U, ones):
+    U0, U1, U2, U3, U4, U5, U6, U7 = U
+    T1 = U0 ^ U3; T2 = U0 ^ U5; T3 = U0 ^ U6; T4 = U3 ^ U5; T5 = U4 ^ U6
+    T6 = T1 ^ T5; T7 = U1 ^ U2; T8 = U7 ^ T6; T9 = U7 ^ T7; T10 = T6 ^ T7
+    T11 = U1 ^ U5; T12 = U2 ^ U5; T13 = T3 ^ T4; T14 = T6 ^ T11; T15 = T5 ^ T11
+    T16 = T5 ^ T12; T17 = T9 ^ T16; T18 = U3 ^ U7; T19 = T7 ^ T18; T20 = T1 ^ T19
+    T21 = U6 ^ U7; T22 = T7 ^ T21; T23 = T2 ^ T22; T24 = T2 ^ T10; T25 = T20 ^ T17
+    T26 = T3 ^ T16; T27 = T1 ^ T12
+    # Inversion in GF(2^4)^2
+    M1 = T13 & T6; M2 = T23 & T8; M3 = T14 ^ M1; M4 = T19 & U7; M5 = M4 ^ M1
+    M6 = T3 & T16; M7 = T22 & T9; M8 = T26 ^ M6; M9 = T20 & T17; M10 = M9 ^ M6
+    M11 = T1 & T15; M12 = T4 & T27; M13 = M12 ^ M11; M14 = T2 & T10; M15 = M14 ^ M11
+    M16 = M3 ^ M2; M17 = M5 ^ T24; M18 = M8 ^ M7; M19 = M10 ^ M15; M20 = M16 ^ M13
+    M21 = M17 ^ M15; M22 = M18 ^ M13; M23 = M19 ^ T25; M24 = M22 ^ M23; M25 = M22 & M20
+    M26 = M21 ^ M25; M27 = M20 ^ M21; M28 = M23 ^ M25; M29 = M28 & M27; M30 = M26 & M24
+    M31 = M20 & M23; M32 = M27 & M31; M33 = M27 ^ M25; M34 = M21 & M22; M35 = M24 & M34
+    M36 = M24 ^ M25; M37 = M21 ^ M29; M38 = M32 ^ M33; M39 = M23 ^ M30; M40 = M35 ^ M36
+    M41 = M38 ^ M40; M42 = M37 ^ M39; M43 = M37 ^ M38; M44 = M39 ^ M40; M45 = M42 ^ M41
+    M46 = M44 & T6; M47 = M40 & T8; M48 = M39 & U7; M49 = M43 & T16; M50 = M38 & T9
+    M51 = M37 & T17; M52 = M42 & T15; M53 = M45 & T27; M54 = M41 & T10; M55 = M44 & T13
+    M56 = M40 & T23; M57 = M39 & T19; M58 = M43 & T3; M59 = M38 & T22; M60 = M37 & T20
+    M61 = M42 & T1; M62 = M45 & T4; M63 = M41 & T2
+    # Output linear layer, including the affine constant 0x63
+    L0 = M61 ^ M62; L1 = M50 ^ M56; L2 = M46 ^ M48; L3 = M47 ^ M55; L4 = M54 ^ M58
+    L5 = M49 ^ M61; L6 = M62 ^ L5; L7 = M46 ^ L3; L8 = M51 ^ M59; L9 = M52 ^ M53
+    L10 = M53 ^ L4; L11 = M60 ^ L2; L12 = M48 ^ M51; L13 = M50 ^ L0; L14 = M52 ^ M61
+    L15 = M55 ^ L1; L16 = M56 ^ L0; L17 = M57 ^ L1; L18 = M58 ^ L8; L19 = M63 ^ L4
+    L20 = L0 ^ L1; L21 = L1 ^ L7; L22 = L3 ^ L12; L23 = L18 ^ L2; L24 = L15 ^ L9
+    L25 = L6 ^ L10; L26 = L7 ^ L9; L27 = L8 ^ L10; L28 = L11 ^ L14; L29 = L11 ^ L17
+    return [L6 ^ L24, L16 ^ L26 ^ ones, L19 ^ L28 ^ ones, L6 ^ L21,
+            L20 ^ L22, L25 ^ L29, L13 ^ L27 ^ ones, L6 ^ L23 ^ ones]
+
+# Multiply by 0x02 (bits MSB first)
+def xtime(s):
+    return [s[1], s[2], s[3], s[4] ^ s[0], s[5] ^ s[0], s[6], s[7] ^ s[0], s[0]]
+
+def xor_byte(a, b):
+    return [x ^ y for x, y in zip(a, b)]
+
+# Row i of the state is bytes i, 4+i, 8+i, 12+i; byte k of a row moves left by i
+def shift_rows(state):
+    return [state[4 * ((p // 4 + p % 4) % 4) + p % 4] for p in range(16)]
+
+# state x Mixer along each row: out[k] = 2a[k] ^ 3a[k-1] ^ a[k+1] ^ a[k+2]
+def mix_columns(state):
+    out = [None] * 16
+    for i in range(4):
+        a = [state[4 * k + i] for k in range(4)]
+        t = xor_byte(xor_byte(a[0], a[1]), xor_byte(a[2], a[3]))
+        for k in range(4):
+            out[4 * k + i] = xor_byte(xor_byte(t, a[k]), xtime(xor_byte(a[k], a[k - 1])))
+    return out
+
+# Round key (four row words) as a list of (byte, bit) positions that are set
+def key_bits(rows):
+    bits = []
+    for p in range(16):
+        byte = (rows[p % 4] >> (24 - 8 * (p // 4))) & 0xFF
+        bits += [(p, i) for i in range(8) if byte >> (7 - i) & 1]
+    return bits
+
+def add_round_key(state, bits, ones):
+    for p, i in bits:
+        state[p][i] ^= ones
+
+def encrypt_slices(state, round_keys, ones):
+    keys = [key_bits(rows) for rows in round_keys]
+    state = [list(byte) for byte in state]
+    add_round_key(state, keys[0], ones)
+    for rnd in range(1, 11):
+        state = shift_rows([sub_byte(byte, ones) for byte in state])
+        if rnd != 10:
+            state = mix_columns(state)
+        add_round_key(state, keys[rnd], ones)
+    return state
+
+# Masks for moving between one bit per block and one byte per block
+@functools.lru_cache(maxsize=8)
+def spread_masks(n):
+    words = (n + 7) // 8
+    return tuple(int.from_bytes(pattern * words, 'little') for pattern in (
+        (0x0101010101010101).to_bytes(8, 'little'),
+        (0x0003000300030003).to_bytes(8, 'little'),
+        (0x0000000F0000000F).to_bytes(8, 'little'),
+        (0x00000000000000FF).to_bytes(8, 'little'),
+    ))
+
+# x has one bit per byte (bit 8k); gather them into bits 0..n-1
+def compress(x, n):
+    m1, m2, m3, m4 = spread_masks(n)
+    x = (x | x >> 7) & m2
+    x = (x | x >> 14) & m3
+    x = (x | x >> 28) & m4
+    return int.from_bytes(x.to_bytes((n + 7) // 8 * 8, 'little')[::8], 'little')
+
+# Inverse of compress: bit k moves to bit 8k
+def spread(x, n):
+    m1, m2, m3, m4 = spread_masks(n)
+    buf = bytearray((n + 7) // 8 * 8)
+    buf[::8] = x.to_bytes((n + 7) // 8, 'little')
+    x = int.from_bytes(buf, 'little')
+    x = (x | x << 28) & m3
+    x = (x | x << 14) & m2
+    return (x | x << 7) & m1
+
+def blocks_to_slices(data):
+    n = len(data) // 16
+    m1 = spread_masks(n)[0]
+    state = []
+    for p in range(16):
+        column = int.from_bytes(data[p::16], 'little')
+        state.append([compress((column >> (7 - i)) & m1, n) for i in range(8)])
+    return state
+
+def slices_to_blocks(state, n):
+    out = bytearray(16 * n)
+    for p in range(16):
+        column = 0
+        for i in range(8):
+            column |= spread(state[p][i], n) << (7 - i)
+        out[p::16] = column.to_bytes(n, 'little')
+    return bytes(out)
+
+def ones_between(lo, hi):
+    return ((1 << (hi - lo)) - 1) << lo if hi > lo else 0
+
+# Bit b of the counters iv, iv + 1, ..., iv + n - 1 (mod 2^128) as one int.
+# The bit is a square wave with period 2^(b+1), so no counter block is built.
+def counter_bit(iv, n, b):
+    period, half = 1 << (b + 1), 1 << b
+    start = iv % period
+    if period > n:
+        # Less than one period: at most two runs of ones
+        return (ones_between(max(half - start, 0), min(period - start, n))
+                | ones_between(max(period + half - start, 0), min(2 * period - start, n)))
+    wave = ones_between(half, period)
+    wave = ((wave >> start) | (wave << (period - start))) & ((1 << period) - 1)
+    width = period
+    while width < n:
+        wave |= wave << width
+        width *= 2
+    return wave & ((1 << n) - 1)
+
+def counter_slices(iv, n):
+    return [[counter_bit(iv, n, 8 * (15 - p) + 7 - i) for i in range(8)] for p in range(16)]
+
+# data is a whole number of blocks
+def encrypt_blocks(data, round_keys):
+    n = len(data) // 16
+    state = encrypt_slices(blocks_to_slices(data), round_keys, (1 << n) - 1)
+    return slices_to_blocks(state, n)
+
+def ctr_keystream(iv, n, round_keys):
+    if n < min_batch:
+        return b"".join(ttable.encrypt_block(((iv + i) % (1 << 128)).to_bytes(16, 'big'), round_keys) for i in range(n))
+    out = bytearray()
+    for start in range(0, n, batch_blocks):
+        count = min(batch_blocks, n - start)
+        state = counter_slices((iv + start) % (1 << 128), count)
+        out += slices_to_blocks(encrypt_slices(state, round_keys, (1 << count) - 1), count)
+    return bytes(out)
+
+# CTR encryption and decryption are the same operation
+def ctr_xor(data, iv, round_keys):
+    keystream = ctr_keystream(iv, (len(data) + 15) // 16, round_keys)
+    return (int.from_bytes(data, 'big') ^ int.from_bytes(keystream[:len(data)], 'big')).to_bytes(len(data), 'big')
+
+# Cross-check against the scalar T-table engine, which matches the reference
+def self_check(blocks=1000):
+    import os
+    round_keys = ttable.expand_key(os.urandom(16))
+    data = os.urandom(blocks * 16)
+    expected = b"".join(ttable.encrypt_block(data[i:i + 16], round_keys) for i in range(0, len(data), 16))
+    if encrypt_blocks(data, round_keys) != expected:
+        return False
+    iv = (1 << 128) - blocks // 2  # make the counter wrap inside the batch
+    expected = b"".join(ttable.encrypt_block(((iv + i) % (1 << 128)).to_bytes(16, 'big'), round_keys) for i in range(blocks))
+    return ctr_keystream(iv, blocks, round_keys) == expected
+
+if __name__ == "__main__":
+    print("Bitsliced engine matches T-table engine:", self_check())
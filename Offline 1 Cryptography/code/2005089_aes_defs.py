@@ -1,7 +1,10 @@
 import random, string
 import importlib
+import functools
 from BitVector import BitVector # type: ignore
 bvd = importlib.import_module('2005089_bitvector-demo')
+gf = importlib.import_module('2005089_gf_tables')
+ttable = importlib.import_module('2005089_aes_ttable')
 modulus = BitVector(bitstring='100011011')  # x^8 + x^4 + x^3 + x + 1
 
 # The value of rc_i is computed as follows:
@@ -44,6 +47,39 @@ def generate_r_key(prev_key, rcon):
 
     return w4 + w5 + w6 + w7 
 
+# Expands one 16-byte key into everything the engines need per round:
+#   encrypt_keys - T-table row keys, decrypt_keys - equivalent inverse schedule
+#   round_keys   - the 11 BitVector round keys from generate_r_key
+#   states       - the same keys as State objects for encrypte / decrypte
+# The BitVector keys cost ~100x the T-table ones and only the reference engine
+# reads them, so they are built on first use.
+class KeySchedule:
+    def __init__(self, key):
+        self.key = bytes(key)
+        self.encrypt_keys = ttable.expand_key(self.key)
+        self.decrypt_keys = ttable.inverse_key(self.encrypt_keys)
+
+    @functools.cached_property
+    def round_keys(self):
+        rcons = generate_r_constant()
+        keys = [BitVector(rawbytes=self.key)]
+        for i in range(10):
+            keys.append(generate_r_key(keys[-1], rcons[i]))
+        return keys
+
+    @functools.cached_property
+    def states(self):
+        return [State.from_bitvector(k) for k in self.round_keys]
+
+# Sessions that reuse a key (same shared secret, same file key) skip expansion
+@functools.lru_cache(maxsize=32)
+def get_key_schedule(key):
+    return KeySchedule(key)
+
+# AES key from the ECDH shared secret: the leading 128 bits of its binary form
+def shared_key_bytes(shared_key):
+    return int(bin(shared_key)[2:].zfill(128)[:128], 2).to_bytes(16, 'big')
+
 def random_padding_generator(length):
     return ''.join(random.choices(string.ascii_letters + string.digits, k=length))
 # key if less than 16 bytes: pad with random characters
@@ -118,6 +154,67 @@ def print_matrix(matrix):
             print_hex(matrix[i][j]) 
         print()
 
+SboxBytes = bytes(bvd.Sbox)
+InvSboxBytes = bytes(bvd.InvSbox)
+
+# 16-byte AES state in block order, so byte 4*j + i is row i, column j
+# (the same cell create_matrix puts at matrix[i][j]). Every round step
+# rewrites the buffer in place.
+class State:
+    __slots__ = ("data",)
+
+    def __init__(self, data=None):
+        self.data = bytearray(16) if data is None else bytearray(data)
+
+    @classmethod
+    def from_bitvector(cls, bv):
+        return cls(bv.intValue().to_bytes(16, 'big'))
+
+    def to_bitvector(self):
+        return BitVector(rawbytes=bytes(self.data))
+
+    def to_matrix(self):
+        return create_matrix(self.to_bitvector())
+
+    def sub_bytes(self):
+        self.data[:] = self.data.translate(SboxBytes)
+
+    def inv_sub_bytes(self):
+        self.data[:] = self.data.translate(InvSboxBytes)
+
+    # Row i is rotated left by i
+    def shift_rows(self):
+        d = self.data
+        d[1], d[5], d[9], d[13] = d[5], d[9], d[13], d[1]
+        d[2], d[6], d[10], d[14] = d[10], d[14], d[2], d[6]
+        d[3], d[7], d[11], d[15] = d[15], d[3], d[7], d[11]
+
+    def inv_shift_rows(self):
+        d = self.data
+        d[1], d[5], d[9], d[13] = d[13], d[1], d[5], d[9]
+        d[2], d[6], d[10], d[14] = d[10], d[14], d[2], d[6]
+        d[3], d[7], d[11], d[15] = d[7], d[11], d[15], d[3]
+
+    # state x mixer, like mix_column: each row is combined with the mixer columns
+    def mix_columns(self, tables=gf.MixerTables):
+        d = self.data
+        (t00, t01, t02, t03), (t10, t11, t12, t13), (t20, t21, t22, t23), (t30, t31, t32, t33) = tables
+        for i in range(4):
+            a0, a1, a2, a3 = d[i], d[4 + i], d[8 + i], d[12 + i]
+            d[i] = t00[a0] ^ t10[a1] ^ t20[a2] ^ t30[a3]
+            d[4 + i] = t01[a0] ^ t11[a1] ^ t21[a2] ^ t31[a3]
+            d[8 + i] = t02[a0] ^ t12[a1] ^ t22[a2] ^ t32[a3]
+            d[12 + i] = t03[a0] ^ t13[a1] ^ t23[a2] ^ t33[a3]
+
+    def inv_mix_columns(self):
+        self.mix_columns(gf.InvMixerTables)
+
+    def add_round_key(self, key):
+        d = self.data
+        k = key.data if isinstance(key, State) else key
+        for i in range(16):
+            d[i] ^= k[i]
+
 # Substitution bitVector using S-box
 def substitute_bitvector(matrix_bv): 
     result = BitVector(size=0)
@@ -166,20 +263,23 @@ def inv_shift_rows(matrix):
         shifted = row >> (8 * i)
         result.append([shifted[8 * j : 8 * (j + 1)] for j in range(4)])
     return result
-# Mix columns using Galois field multiplication
+# Mix columns using the precomputed Galois field product tables
 def mix_column(m1, m2):
-    result = []
-    for i in range(4):
-        row = []
-        for j in range(4):
-            cell_val = BitVector(size=8)
-            for k in range(4):
-                cell_val ^= m1[i][k].gf_multiply_modular(m2[k][j], modulus, 8)
-            row.append(cell_val)
-        result.append(row)
-    return result 
+    state = [[cell.intValue() for cell in row] for row in m1]
+    mixer = [[cell.intValue() for cell in row] for row in m2]
+    mixed = gf.mix_matrix(state, mixer)
+    return [[BitVector(intVal=cell, size=8) for cell in row] for row in mixed]
 
+# encrypte / decrypte take either a 4x4 BitVector matrix (returns a new
+# matrix) or a State (updated in place and returned)
 def encrypte(matrix, key_matrix, round_no):
+    if isinstance(matrix, State):
+        matrix.sub_bytes()
+        matrix.shift_rows()
+        if round_no != 9:
+            matrix.mix_columns()
+        matrix.add_round_key(key_matrix)
+        return matrix
     new_matrix = substitute_matrix_bytes(matrix)
     new_matrix = shift_rows(new_matrix) 
     if round_no != 9:
@@ -188,9 +288,103 @@ def encrypte(matrix, key_matrix, round_no):
     return new_matrix
 
 def decrypte(matrix, key_matrix, round_no): 
+    if isinstance(matrix, State):
+        matrix.inv_shift_rows()
+        matrix.inv_sub_bytes()
+        matrix.add_round_key(key_matrix)
+        if round_no != 0:
+            matrix.inv_mix_columns()
+        return matrix
     new_matrix = inv_shift_rows(matrix)
     new_matrix = inverse_substitute_matrix_bytes(new_matrix)
     new_matrix = xor_round_key(new_matrix, key_matrix)
     if round_no != 0:
         new_matrix = mix_column(new_matrix, bvd.InvMixer)
-    return new_matrix
\ No newline at end of file
+    return new_matrix
+# Block cipher object over bytes, shared by all the drivers. engine picks
+# how blocks are processed:
+#   "reference" - State rounds through encrypte / decrypte
+#   "ttable"    - 2005089_aes_ttable, one block at a time
+#   "numpy"     - 2005089_aes_numpy batches for CTR and CBC decryption
+#                 (single blocks and serial CBC encryption use the T-tables)
+#   "bitslice"  - 2005089_aes_bitslice batches for the CTR keystream, pure
+#                 Python (everything else uses the T-tables)
+# workers > 1 spreads CTR and CBC decryption over a process pool.
+engines = ("reference", "ttable", "numpy", "bitslice")
+
+class AES:
+    def __init__(self, key, engine="ttable", workers=1):
+        if engine not in engines:
+            raise ValueError(f"Unknown engine {engine!r}, expected one of {engines}")
+        # "numpy" is only there when NumPy imports
+        available = importlib.import_module('2005089_aes_parallel').engines
+        if engine not in available:
+            raise ValueError(f"Engine {engine!r} is not available (is NumPy installed?), expected one of {available}")
+        self.key = bytes(key)
+        self.engine = engine
+        self.workers = workers
+        self.schedule = get_key_schedule(self.key)
+        if engine == "reference":
+            self.schedule.states  # expand the BitVector keys here, not in the first block
+
+    def encrypt_block(self, block):
+        if self.engine == "reference":
+            state = State(block)
+            state.add_round_key(self.schedule.states[0])
+            for rnd in range(10):
+                encrypte(state, self.schedule.states[rnd + 1], rnd)
+            return bytes(state.data)
+        return ttable.encrypt_block(block, self.schedule.encrypt_keys)
+
+    def decrypt_block(self, block):
+        if self.engine == "reference":
+            state = State(block)
+            state.add_round_key(self.schedule.states[10])
+            for rnd in range(9, -1, -1):
+                decrypte(state, self.schedule.states[rnd], rnd)
+            return bytes(state.data)
+        return ttable.decrypt_block(block, self.schedule.decrypt_keys)
+
+    # Keystream for counters counter, counter + 1, ... (mod 2^128), as bytes
+    def keystream(self, counter, n_blocks):
+        return b''.join(importlib.import_module('2005089_aes_parallel').ctr_keystream(self.key, counter, n_blocks, self.engine, self.workers))
+
+    # Streaming update() / finalize() objects from 2005089_aes_stream; aad is
+    # only used by "gcm"
+    def encryptor(self, mode, iv, aad=b""):
+        return importlib.import_module('2005089_aes_stream').encryptor(mode, self.key, iv, self.engine, self.workers, aad)
+
+    def decryptor(self, mode, iv, unpad=True, aad=b""):
+        return importlib.import_module('2005089_aes_stream').decryptor(mode, self.key, iv, self.engine, self.workers, unpad, aad)
+
+    # CBC with PKCS#7 padding; iv is a 128-bit int and is not part of the output
+    def encrypt_cbc(self, plaintext, iv):
+        encryptor = self.encryptor("cbc", iv)
+        return encryptor.update(plaintext) + encryptor.finalize()
+
+    def decrypt_cbc(self, ciphertext, iv, unpad=True):
+        decryptor = self.decryptor("cbc", iv, unpad)
+        return decryptor.update(ciphertext) + decryptor.finalize()
+
+    # CTR keystream XOR, no padding; encryption and decryption are the same
+    def encrypt_ctr(self, data, iv):
+        return importlib.import_module('2005089_aes_parallel').ctr_xor(data, self.key, iv, self.engine, self.workers)
+
+    decrypt_ctr = encrypt_ctr
+
+    # GCM: returns ciphertext || tag; iv is a 96-bit int or nonce bytes
+    def encrypt_gcm(self, plaintext, iv, aad=b""):
+        encryptor = self.encryptor("gcm", iv, aad=aad)
+        return encryptor.update(plaintext) + encryptor.finalize()
+
+    # Raises ValueError if the tag does not match
+    def decrypt_gcm(self, data, iv, aad=b""):
+        decryptor = self.decryptor("gcm", iv, aad=aad)
+        return decryptor.update(data) + decryptor.finalize()
+
+    # Files are streamed as IV || ciphertext (|| tag for "gcm")
+    def encrypt_file(self, src, dst, mode="cbc", iv=None):
+        importlib.import_module('2005089_aes_stream').encrypt_file(src, dst, self.key, mode, self.engine, iv, self.workers)
+
+    def decrypt_file(self, src, dst, mode="cbc"):
+        importlib.import_module('2005089_aes_stream').decrypt_file(src, dst, self.key, mode, self.engine, self.workers)
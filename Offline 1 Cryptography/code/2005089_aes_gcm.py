@@ -0,0 +1,261 @@
+import functools
+import hmac
+
+# GCM (NIST SP 800-38D) on top of any block cipher object that has
+# encrypt_block(bytes) and keystream(counter, n_blocks), i.e. 2005089_aes_defs.AES.
+# Encryption is the CTR keystream from the AES engines; authentication is
+# GHASH with 8-bit tables: one 256-entry table per byte position holding
+# (byte . x^8j) . H, so a multiply by H is 16 lookups and 15 XORs and needs
+# no reduction step.
+#
+# Stream layout produced by GCMEncryptor: ciphertext || 16-byte tag.
+
+tag_size = 16
+nonce_size = 12  # 96-bit IVs take the fast J0 = IV || 0^31 || 1 path
+R = 0xE1 << 120  # x^128 = x^7 + x^2 + x + 1 in GCM's reflected bit order
+
+# Bit-by-bit multiply in GF(2^128), only used to fill and check the tables
+def gf_mult(x, y):
+    z, v = 0, y
+    for i in range(127, -1, -1):
+        if (x >> i) & 1:
+            z ^= v
+        v = (v >> 1) ^ R if v & 1 else v >> 1
+    return z
+
+# tables[j][b] = (byte b at position j) . H
+@functools.lru_cache(maxsize=32)
+def ghash_tables(h):
+    # powers[i] = x^i . H; x is a right shift in GCM's bit order
+    powers = [h]
+    for _ in range(127):
+        v = powers[-1]
+        powers.append((v >> 1) ^ R if v & 1 else v >> 1)
+    tables = []
+    for j in range(16):
+        table = [0] * 256
+        for b in range(1, 256):
+            low = b & -b
+            # bit 0x80 of byte j is the coefficient of x^(8j)
+            table[b] = table[b ^ low] ^ powers[8 * j + 7 - low.bit_length() + 1]
+        tables.append(tuple(table))
+    return tuple(tables)
+
+class GHASH:
+    def __init__(self, h):
+        self.tables = ghash_tables(h)
+        self.y = 0
+        self.buffer = b""
+
+    def update(self, data):
+        data = self.buffer + data
+        n = len(data) - len(data) % 16
+        T0, T1, T2, T3, T4, T5, T6, T7, T8, T9, T10, T11, T12, T13, T14, T15 = self.tables
+        y = self.y
+        for i in range(0, n, 16):
+            b = (y ^ int.from_bytes(data[i:i + 16], 'big')).to_bytes(16, 'big')
+            y = (T0[b[0]] ^ T1[b[1]] ^ T2[b[2]] ^ T3[b[3]] ^ T4[b[4]] ^ T5[b[5]] ^ T6[b[6]] ^ T7[b[7]]
+                 ^ T8[b[8]] ^ T9[b[9]] ^ T10[b[10]] ^ T11[b[11]] ^ T12[b[12]] ^ T13[b[13]] ^ T14[b[14]] ^ T15[b[15]])
+        self.y = y
+        self.buffer = data[n:]
+
+    # Zero-fill the partial block that ends the AAD or the ciphertext
+    def pad(self):
+        if self.buffer:
+            self.update(bytes(16 - len(self.buffer)))
+        return self.y
+
+def inc32(counter, n=1):
+    return (counter & ~0xFFFFFFFF) | ((counter + n) & 0xFFFFFFFF)
+
+def nonce_bytes(iv):
+    return iv.to_bytes(nonce_size, 'big') if isinstance(iv, int) else bytes(iv)
+
+def initial_counter(iv, h):
+    if len(iv) == nonce_size:
+        return int.from_bytes(iv + b"\x00\x00\x00\x01", 'big')
+    g = GHASH(h)
+    g.update(iv)
+    g.pad()
+    g.update((len(iv) * 8).to_bytes(16, 'big'))
+    return g.y
+
+# GCM counters only carry inside the low 32 bits, so the keystream is cut
+# wherever that word wraps
+def gctr_keystream(cipher, counter, n_blocks):
+    out = []
+    while n_blocks:
+        count = min(n_blocks, (1 << 32) - (counter & 0xFFFFFFFF))
+        out.append(cipher.keystream(counter, count))
+        counter = inc32(counter, count)
+        n_blocks -= count
+    return b"".join(out)
+
+class GCMCipher:
+    def __init__(self, cipher, iv, aad=b""):
+        iv = nonce_bytes(iv)
+        if not iv:
+            raise ValueError("GCM IV must not be empty")
+        self.cipher = cipher
+        h = int.from_bytes(cipher.encrypt_block(bytes(16)), 'big')
+        j0 = initial_counter(iv, h)
+        self.tag_mask = int.from_bytes(cipher.encrypt_block(j0.to_bytes(16, 'big')), 'big')
+        self.counter = inc32(j0)
+        self.ghash = GHASH(h)
+        self.ghash.update(aad)
+        self.ghash.pad()
+        self.aad_len = len(aad)
+        self.data_len = 0
+        self.buffer = b""
+
+    def crypt(self, data):
+        n_blocks = (len(data) + 15) // 16
+        keystream = gctr_keystream(self.cipher, self.counter, n_blocks)
+        self.counter = inc32(self.counter, n_blocks)
+        self.data_len += len(data)
+        return (int.from_bytes(data, 'big') ^ int.from_bytes(keystream[:len(data)], 'big')).to_bytes(len(data), 'big')
+
+    def compute_tag(self):
+        self.ghash.pad()
+        self.ghash.update((self.aad_len * 8).to_bytes(8, 'big') + (self.data_len * 8).to_bytes(8, 'big'))
+        return (self.ghash.y ^ self.tag_mask).to_bytes(16, 'big')
+
+class GCMEncryptor(GCMCipher):
+    def update(self, chunk):
+        data = self.buffer + chunk
+        n = len(data) - len(data) % 16
+        self.buffer = data[n:]
+        out = self.crypt(data[:n])
+        self.ghash.update(out)
+        return out
+
+    # Last partial block followed by the tag
+    def finalize(self):
+        out = self.crypt(self.buffer)
+        self.buffer = b""
+        self.ghash.update(out)
+        self.tag = self.compute_tag()
+        return out + self.tag
+
+# With tag=None the last 16 bytes of the stream are taken as the tag.
+# Plaintext from update() is unauthenticated until finalize() returns.
+class GCMDecryptor(GCMCipher):
+    def __init__(self, cipher, iv, aad=b"", tag=None):
+        super().__init__(cipher, iv, aad)
+        self.tag = tag
+
+    def update(self, chunk):
+        data = self.buffer + chunk
+        n = max(len(data) - (tag_size if self.tag is None else 0), 0)
+        n -= n % 16
+        self.buffer = data[n:]
+        self.ghash.update(data[:n])
+        return self.crypt(data[:n])
+
+    def finalize(self):
+        data, tag = self.buffer, self.tag
+        self.buffer = b""
+        if tag is None:
+            if len(data) < tag_size:
+                raise ValueError("GCM data is shorter than the tag")
+            data, tag = data[:-tag_size], data[-tag_size:]
+        self.ghash.update(data)
+        out = self.crypt(data)
+        if not hmac.compare_digest(self.compute_tag(), tag):
+            raise ValueError("GCM authentication tag mismatch")
+        return out
+
+# FIPS-197 AES from pycryptodome, only for the published test vectors (the
+# course cipher's key schedule differs from the standard one)
+class StandardAES:
+    def __init__(self, key):
+        from Crypto.Cipher import AES # type: ignore
+        self.ecb = AES.new(key, AES.MODE_ECB)
+
+    def encrypt_block(self, block):
+        return self.ecb.encrypt(block)
+
+    def keystream(self, counter, n_blocks):
+        return self.ecb.encrypt(b"".join(((counter + i) % (1 << 128)).to_bytes(16, 'big') for i in range(n_blocks)))
+
+# McGrew & Viega, "The Galois/Counter Mode of Operation", test cases 1-6
+# (key, iv, plaintext, aad, ciphertext, tag)
+test_vectors = [
+    ("00000000000000000000000000000000", "000000000000000000000000", "", "", "",
+     "58e2fccefa7e3061367f1d57a4e7455a"),
+    ("00000000000000000000000000000000", "000000000000000000000000", "00000000000000000000000000000000", "",
+     "0388dace60b6a392f328c2b971b2fe78", "ab6e47d42cec13bdf53a67b21257bddf"),
+    ("feffe9928665731c6d6a8f9467308308", "cafebabefacedbaddecaf888",
+     "d9313225f88406e5a55909c5aff5269a86a7a9531534f7da2e4c303d8a318a721c3c0c95956809532fcf0e2449a6b525b16aedf5aa0de657ba637b391aafd255",
+     "",
+     "42831ec2217774244b7221b784d0d49ce3aa212f2c02a4e035c17e2329aca12e21d514b25466931c7d8f6a5aac84aa051ba30b396a0aac973d58e091473f5985",
+     "4d5c2af327cd64a62cf35abd2ba6fab4"),
+    ("feffe9928665731c6d6a8f9467308308", "cafebabefacedbaddecaf888",
+     "d9313225f88406e5a55909c5aff5269a86a7a9531534f7da2e4c303d8a318a721c3c0c95956809532fcf0e2449a6b525b16aedf5aa0de657ba637b39",
+     "feedfacedeadbeeffeedfacedeadbeefabaddad2",
+     "42831ec2217774244b7221b784d0d49ce3aa212f2c02a4e035c17e2329aca12e21d514b25466931c7d8f6a5aac84aa051ba30b396a0aac973d58e091",
+     "5bc94fbc3221a5db94fae95ae7121a47"),
+    ("feffe9928665731c6d6a8f9467308308", "cafebabefacedbad",
+     "d9313225f88406e5a55909c5aff5269a86a7a9531534f7da2e4c303d8a318a721c3c0c95956809532fcf0e2449a6b525b16aedf5aa0de657ba637b39",
+     "feedfacedeadbeeffeedfacedeadbeefabaddad2",
+     "61353b4c2806934a777ff51fa22a4755699b2a714fcdc6f83766e5f97b6c742373806900e49f24b22b097544d4896b424989b5e1ebac0f07c23f4598",
+     "3612d2e79e3b0785561be14aaca2fccb"),
+    ("feffe9928665731c6d6a8f9467308308",
+     "9313225df88406e555909c5aff5269aa6a7a9538534f7da1e4c303d2a318a728c3c0c95156809539fcf0e2429a6b525416aedbf5a0de6a57a637b39b",
+     "d9313225f88406e5a55909c5aff5269a86a7a9531534f7da2e4c303d8a318a721c3c0c95956809532fcf0e2449a6b525b16aedf5aa0de657ba637b39",
+     "feedfacedeadbeeffeedfacedeadbeefabaddad2",
+     "8ce24998625615b603a033aca13fb894be9112a5c3a211a8ba262a3cca7e2ca701e4a9a4fba43c90ccdcb281d48c7c6fd62875d2aca417034c34aee5",
+     "619cc5aefffe0bfa462af43c1699d050"),
+]
+
+def self_check():
+    # GHASH on its own: test case 2, H = E(0^128) and one ciphertext block
+    g = GHASH(0x66e94bd4ef8a2c3b884cfa59ca342b2e)
+    g.update(bytes.fromhex("0388dace60b6a392f328c2b971b2fe78") + (128).to_bytes(16, 'big'))
+    if g.y != 0xf38cbb1ad69223dcc3457ae5b6b0f885:
+        return False
+    if any(ghash_tables(g.y)[j][b] != gf_mult(b << (120 - 8 * j), g.y) for j in (0, 7, 15) for b in range(256)):
+        return False
+    for key, iv, plaintext, aad, ciphertext, tag in test_vectors:
+        cipher = StandardAES(bytes.fromhex(key))
+        iv, aad = bytes.fromhex(iv), bytes.fromhex(aad)
+        enc = GCMEncryptor(cipher, iv, aad)
+        plaintext = bytes.fromhex(plaintext)
+        # feed it in uneven pieces to exercise the buffering
+        out = enc.update(plaintext[:7]) + enc.update(plaintext[7:40]) + enc.update(plaintext[40:]) + enc.finalize()
+        if out != bytes.fromhex(ciphertext + tag):
+            return False
+        dec = GCMDecryptor(cipher, iv, aad)
+        if dec.update(out[:21]) + dec.update(out[21:]) + dec.finalize() != plaintext:
+            return False
+    # Tampering is caught
+    dec = GCMDecryptor(cipher, iv, aad)
+    dec.update(out[:-1] + bytes([out[-1] ^ 1]))
+    try:
+        dec.finalize()
+        return False
+    except ValueError:
+        pass
+    # ... and a tampered file leaves no plaintext behind
+    import importlib, os, tempfile
+    defs = importlib.import_module('2005089_aes_defs')
+    parallel = importlib.import_module('2005089_aes_parallel')
+    file_cipher = defs.AES(os.urandom(16), parallel.default_engine)
+    with tempfile.TemporaryDirectory() as tmp:
+        src, enc_path, dst = (os.path.join(tmp, name) for name in ("in", "enc", "out"))
+        with open(src, "wb") as f:
+            f.write(os.urandom(3 << 20))
+        file_cipher.encrypt_file(src, enc_path, "gcm")
+        with open(enc_path, "r+b") as f:
+            f.seek(-1, os.SEEK_END)
+            last = f.read(1)
+            f.seek(-1, os.SEEK_END)
+            f.write(bytes([last[0] ^ 1]))
+        try:
+            file_cipher.decrypt_file(enc_path, dst, "gcm")
+            return False
+        except ValueError:
+            return sorted(os.listdir(tmp)) == ["enc", "in"]
+
+if __name__ == "__main__":
+    print("GCM matches the published test vectors:", self_check())
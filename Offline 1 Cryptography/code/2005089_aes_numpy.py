@@ -0,0 +1,148 @@
+import importlib
+import numpy as np
+ttable = importlib.import_module('2005089_aes_ttable')
+
+# NumPy version of the T-table engine: a batch of N blocks is held as four
+# (N,) uint32 row-word arrays and every round is done for the whole batch with
+# fancy-indexed table lookups and vectorized XORs.
+
+Te0 = np.array(ttable.Te0, dtype=np.uint32)
+Te1 = np.array(ttable.Te1, dtype=np.uint32)
+Te2 = np.array(ttable.Te2, dtype=np.uint32)
+Te3 = np.array(ttable.Te3, dtype=np.uint32)
+Sbox = np.array(ttable.Sbox, dtype=np.uint32)
+Td0 = np.array(ttable.Td0, dtype=np.uint32)
+Td1 = np.array(ttable.Td1, dtype=np.uint32)
+Td2 = np.array(ttable.Td2, dtype=np.uint32)
+Td3 = np.array(ttable.Td3, dtype=np.uint32)
+InvSbox = np.array(ttable.InvSbox, dtype=np.uint32)
+
+# Blocks per vectorized pass; bounds the size of the temporaries
+batch_blocks = 1 << 16
+
+def keys_to_array(round_keys):
+    return np.array(round_keys, dtype=np.uint32)
+
+def blocks_to_rows(blocks):
+    b = blocks.astype(np.uint32)
+    return [(b[:, i] << 24) | (b[:, 4 + i] << 16) | (b[:, 8 + i] << 8) | b[:, 12 + i] for i in range(4)]
+
+def rows_to_blocks(rows):
+    out = np.empty((rows[0].shape[0], 16), dtype=np.uint8)
+    for i in range(4):
+        r = rows[i]
+        out[:, i] = r >> 24
+        out[:, 4 + i] = (r >> 16) & 0xFF
+        out[:, 8 + i] = (r >> 8) & 0xFF
+        out[:, 12 + i] = r & 0xFF
+    return out
+
+def b0(r):
+    return r >> 24
+
+def b1(r):
+    return (r >> 16) & 0xFF
+
+def b2(r):
+    return (r >> 8) & 0xFF
+
+def b3(r):
+    return r & 0xFF
+
+def sub_row(x0, x1, x2, x3, box=Sbox):
+    return (box[x0] << 24) | (box[x1] << 16) | (box[x2] << 8) | box[x3]
+
+# blocks: (N, 16) uint8 -> (N, 16) uint8, same rounds as ttable.encrypt_rows
+def encrypt_blocks(blocks, round_keys):
+    k = keys_to_array(round_keys)
+    r0, r1, r2, r3 = blocks_to_rows(blocks)
+    r0 ^= k[0, 0]; r1 ^= k[0, 1]; r2 ^= k[0, 2]; r3 ^= k[0, 3]
+    for rnd in range(1, 10):
+        t0 = Te0[b0(r0)] ^ Te1[b1(r0)] ^ Te2[b2(r0)] ^ Te3[b3(r0)] ^ k[rnd, 0]
+        t1 = Te0[b1(r1)] ^ Te1[b2(r1)] ^ Te2[b3(r1)] ^ Te3[b0(r1)] ^ k[rnd, 1]
+        t2 = Te0[b2(r2)] ^ Te1[b3(r2)] ^ Te2[b0(r2)] ^ Te3[b1(r2)] ^ k[rnd, 2]
+        t3 = Te0[b3(r3)] ^ Te1[b0(r3)] ^ Te2[b1(r3)] ^ Te3[b2(r3)] ^ k[rnd, 3]
+        r0, r1, r2, r3 = t0, t1, t2, t3
+    t0 = sub_row(b0(r0), b1(r0), b2(r0), b3(r0)) ^ k[10, 0]
+    t1 = sub_row(b1(r1), b2(r1), b3(r1), b0(r1)) ^ k[10, 1]
+    t2 = sub_row(b2(r2), b3(r2), b0(r2), b1(r2)) ^ k[10, 2]
+    t3 = sub_row(b3(r3), b0(r3), b1(r3), b2(r3)) ^ k[10, 3]
+    return rows_to_blocks([t0, t1, t2, t3])
+
+# Inverse of encrypt_blocks, same rounds as ttable.decrypt_rows (equivalent
+# inverse cipher, decrypt_keys from ttable.inverse_key)
+def decrypt_blocks(blocks, decrypt_keys):
+    k = keys_to_array(decrypt_keys)
+    r0, r1, r2, r3 = blocks_to_rows(blocks)
+    r0 ^= k[0, 0]; r1 ^= k[0, 1]; r2 ^= k[0, 2]; r3 ^= k[0, 3]
+    for rnd in range(1, 10):
+        t0 = Td0[b0(r0)] ^ Td1[b1(r0)] ^ Td2[b2(r0)] ^ Td3[b3(r0)] ^ k[rnd, 0]
+        t1 = Td0[b3(r1)] ^ Td1[b0(r1)] ^ Td2[b1(r1)] ^ Td3[b2(r1)] ^ k[rnd, 1]
+        t2 = Td0[b2(r2)] ^ Td1[b3(r2)] ^ Td2[b0(r2)] ^ Td3[b1(r2)] ^ k[rnd, 2]
+        t3 = Td0[b1(r3)] ^ Td1[b2(r3)] ^ Td2[b3(r3)] ^ Td3[b0(r3)] ^ k[rnd, 3]
+        r0, r1, r2, r3 = t0, t1, t2, t3
+    t0 = sub_row(b0(r0), b1(r0), b2(r0), b3(r0), InvSbox) ^ k[10, 0]
+    t1 = sub_row(b3(r1), b0(r1), b1(r1), b2(r1), InvSbox) ^ k[10, 1]
+    t2 = sub_row(b2(r2), b3(r2), b0(r2), b1(r2), InvSbox) ^ k[10, 2]
+    t3 = sub_row(b1(r3), b2(r3), b3(r3), b0(r3), InvSbox) ^ k[10, 3]
+    return rows_to_blocks([t0, t1, t2, t3])
+
+# CBC decryption of whole blocks: every block is decrypted in one batch and
+# XORed with the ciphertext shifted by one block (iv first)
+def cbc_decrypt(data, iv, decrypt_keys):
+    if not data:
+        return b""
+    blocks = np.frombuffer(data, dtype=np.uint8).reshape(-1, 16)
+    prev = np.empty_like(blocks)
+    prev[0] = np.frombuffer(iv.to_bytes(16, 'big'), dtype=np.uint8)
+    prev[1:] = blocks[:-1]
+    out = np.empty_like(blocks)
+    for start in range(0, len(blocks), batch_blocks):
+        end = start + batch_blocks
+        out[start:end] = decrypt_blocks(blocks[start:end], decrypt_keys) ^ prev[start:end]
+    return out.tobytes()
+
+# (N, 16) uint8 big-endian counters iv, iv + 1, ..., iv + N - 1 (mod 2^128)
+def counter_blocks(iv, n):
+    iv_hi, iv_lo = iv >> 64, iv & 0xFFFFFFFFFFFFFFFF
+    lo = np.uint64(iv_lo) + np.arange(n, dtype=np.uint64)
+    hi = np.full(n, iv_hi, dtype=np.uint64) + (lo < np.uint64(iv_lo)).astype(np.uint64)
+    return np.stack([hi, lo], axis=1).astype('>u8').view(np.uint8).reshape(n, 16)
+
+def ctr_keystream(iv, n, round_keys):
+    out = np.empty((n, 16), dtype=np.uint8)
+    for start in range(0, n, batch_blocks):
+        count = min(batch_blocks, n - start)
+        out[start:start + count] = encrypt_blocks(counter_blocks((iv + start) % (1 << 128), count), round_keys)
+    return out
+
+# CTR encryption and decryption are the same operation
+def ctr_xor(data, iv, round_keys):
+    n = (len(data) + 15) // 16
+    keystream = ctr_keystream(iv, n, round_keys).reshape(-1)[:len(data)]
+    return (np.frombuffer(data, dtype=np.uint8) ^ keystream).tobytes()
+
+# Cross-check against the scalar T-table engine
+def self_check(blocks=1000):
+    import os
+    round_keys = ttable.expand_key(os.urandom(16))
+    iv = (1 << 128) - blocks // 2  # make the counter wrap inside the batch
+    data = os.urandom(blocks * 16 - 5)
+    expected = bytearray()
+    for i in range(blocks):
+        expected += ttable.encrypt_block(((iv + i) % (1 << 128)).to_bytes(16, 'big'), round_keys)
+    expected = bytes(x ^ y for x, y in zip(data, expected))
+    if ctr_xor(data, iv, round_keys) != expected:
+        return False
+    ciphertext = os.urandom(blocks * 16)
+    decrypt_keys = ttable.inverse_key(round_keys)
+    prev = iv % (1 << 128)
+    plaintext = bytearray()
+    for i in range(0, len(ciphertext), 16):
+        block = int.from_bytes(ciphertext[i:i + 16], 'big')
+        plaintext += (ttable.decrypt_int(block, decrypt_keys) ^ prev).to_bytes(16, 'big')
+        prev = block
+    return cbc_decrypt(ciphertext, iv % (1 << 128), decrypt_keys) == bytes(plaintext)
+
+if __name__ == "__main__":
+    print("NumPy engine matches T-table engine:", self_check())
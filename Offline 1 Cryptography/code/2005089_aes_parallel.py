@@ -0,0 +1,119 @@
+import importlib
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+defs = importlib.import_module('2005089_aes_defs')
+bitslice = importlib.import_module('2005089_aes_bitslice')
+try:
+    aes_numpy = importlib.import_module('2005089_aes_numpy')
+except ImportError:  # NumPy not installed
+    aes_numpy = None
+
+# Process-pool executors for the modes whose blocks are independent: CTR
+# keystream and CBC decryption. The block range is cut into large contiguous
+# segments and each worker process handles one segment. Workers get the raw
+# key and expand it through get_key_schedule, so every process expands a
+# given key only once. The pool lives as long as the process: streaming
+# callers make one call per chunk and pay the worker start-up only once.
+
+default_workers = os.cpu_count() or 1
+segment_blocks = 1 << 14  # 256 KiB of keystream per task
+
+engines = ("reference", "ttable", "bitslice") + (("numpy",) if aes_numpy is not None else ())
+default_engine = "numpy" if aes_numpy is not None else "bitslice"
+
+def keystream_segment(key, iv, start, count, engine=default_engine):
+    first = (iv + start) % (1 << 128)
+    if engine == "numpy":
+        return aes_numpy.ctr_keystream(first, count, defs.get_key_schedule(key).encrypt_keys).tobytes()
+    if engine == "bitslice":
+        return bitslice.ctr_keystream(first, count, defs.get_key_schedule(key).encrypt_keys)
+    cipher = defs.AES(key, engine)
+    out = bytearray()
+    for i in range(count):
+        out += cipher.encrypt_block(((first + i) % (1 << 128)).to_bytes(16, 'big'))
+    return bytes(out)
+
+pools = {}  # worker count -> ProcessPoolExecutor
+pools_lock = threading.Lock()
+
+# With fork the workers are forked here, on the first call; callers that
+# start threads later (the pipelined receiver) call this up front.
+def get_pool(workers):
+    with pools_lock:
+        pool = pools.get(workers)
+        if pool is None:
+            pool = pools[workers] = ProcessPoolExecutor(max_workers=workers)
+            pool.submit(int).result()  # start the workers now, from this thread
+        return pool
+
+def run_segment(task):
+    return keystream_segment(*task)
+
+# CBC decryption of one segment; prev is the ciphertext block (or IV) before it
+def cbc_decrypt_segment(key, prev, segment, engine=default_engine):
+    if engine == "numpy":
+        return aes_numpy.cbc_decrypt(segment, prev, defs.get_key_schedule(key).decrypt_keys)
+    cipher = defs.AES(key, engine)
+    decrypted = bytearray()
+    for i in range(0, len(segment), 16):
+        decrypted += cipher.decrypt_block(segment[i:i + 16])
+    # XOR with the ciphertext shifted by one block, in one pass
+    shifted = prev.to_bytes(16, 'big') + segment[:-16]
+    return xor_bytes(bytes(decrypted), shifted)
+
+def run_cbc_segment(task):
+    return cbc_decrypt_segment(*task)
+
+def split_segments(n_blocks, blocks_per_segment=segment_blocks):
+    return [(start, min(blocks_per_segment, n_blocks - start)) for start in range(0, n_blocks, blocks_per_segment)]
+
+# Keystream for n_blocks counters starting at iv, as a list of byte segments
+def ctr_keystream(key, iv, n_blocks, engine=default_engine, workers=None, blocks_per_segment=segment_blocks):
+    workers = workers or default_workers
+    tasks = [(key, iv, start, count, engine) for start, count in split_segments(n_blocks, blocks_per_segment)]
+    if workers == 1 or len(tasks) <= 1:
+        return [run_segment(task) for task in tasks]
+    return list(get_pool(workers).map(run_segment, tasks))
+
+def xor_bytes(a, b):
+    return (int.from_bytes(a, 'big') ^ int.from_bytes(b, 'big')).to_bytes(len(a), 'big')
+
+# CBC decrypt of whole blocks (padding is left in place)
+def cbc_decrypt(data, key, iv, engine=default_engine, workers=None, blocks_per_segment=segment_blocks):
+    if len(data) % 16:
+        raise ValueError("Ciphertext length is not a multiple of 16 bytes")
+    workers = workers or default_workers
+    tasks = []
+    for start, count in split_segments(len(data) // 16, blocks_per_segment):
+        prev = iv if start == 0 else int.from_bytes(data[start * 16 - 16:start * 16], 'big')
+        tasks.append((key, prev, data[start * 16:(start + count) * 16], engine))
+    if workers == 1 or len(tasks) <= 1:
+        return b''.join(run_cbc_segment(task) for task in tasks)
+    return b''.join(get_pool(workers).map(run_cbc_segment, tasks))
+
+# CTR encrypt / decrypt of a whole buffer
+def ctr_xor(data, key, iv, engine=default_engine, workers=None, blocks_per_segment=segment_blocks):
+    n_blocks = (len(data) + 15) // 16
+    keystream = b''.join(ctr_keystream(key, iv, n_blocks, engine, workers, blocks_per_segment))
+    return xor_bytes(data, keystream[:len(data)])
+
+if __name__ == "__main__":
+    import time
+    key = os.urandom(16)
+    iv = int.from_bytes(os.urandom(16), 'big')
+    data = os.urandom(4 << 20)
+    for engine in engines:
+        if engine == "reference":
+            continue
+        for workers in sorted({1, default_workers}):
+            start = time.time()
+            out = ctr_xor(data, key, iv, engine, workers)
+            elapsed = time.time() - start
+            assert ctr_xor(out, key, iv, engine, workers) == data
+            print(f"{engine:>8} x{workers} CTR:         {len(data) / elapsed / 1e6:.2f} MB/s")
+            start = time.time()
+            cbc_decrypt(data, key, iv, engine, workers)
+            elapsed = time.time() - start
+            print(f"{engine:>8} x{workers} CBC decrypt: {len(data) / elapsed / 1e6:.2f} MB/s")
@@ -0,0 +1,287 @@
+import importlib
+import os
+import queue
+import threading
+
+defs = importlib.import_module('2005089_aes_defs')
+parallel = importlib.import_module('2005089_aes_parallel')
+gcm = importlib.import_module('2005089_aes_gcm')
+
+# Streaming CBC / CTR with an update(chunk) / finalize() interface. Only the
+# bytes of the current chunk (plus at most one held-back block) are in memory,
+# and PKCS#7 padding is added / removed in finalize().
+#
+# File layout written by encrypt_file: 16-byte IV || ciphertext, or for GCM
+# 12-byte nonce || ciphertext || 16-byte tag (no padding).
+
+chunk_size = 1 << 20  # 1 MiB
+
+def pkcs7_pad(data):
+    pad_len = 16 - (len(data) % 16)
+    return data + bytes([pad_len] * pad_len)
+
+def pkcs7_unpad(data):
+    if not data or len(data) % 16:
+        raise ValueError("Padded data must be a non-empty multiple of 16 bytes")
+    pad_len = data[-1]
+    if not 1 <= pad_len <= 16 or data[-pad_len:] != bytes([pad_len] * pad_len):
+        raise ValueError("Invalid PKCS#7 padding")
+    return data[:-pad_len]
+
+# Split buffered bytes into the part that can be processed now and the tail
+# to keep; hold_last keeps one full block back for the padding check.
+def split_blocks(data, hold_last):
+    keep = len(data) % 16
+    if hold_last and keep == 0:
+        keep = min(16, len(data))
+    return len(data) - keep
+
+# CBC encryption is serial: one block at a time through AES.encrypt_block
+class CBCEncryptor:
+    def __init__(self, key, iv, engine=parallel.default_engine):
+        self.encrypt_block = defs.AES(key, engine).encrypt_block
+        self.prev = iv.to_bytes(16, 'big')
+        self.buffer = b""
+
+    def update(self, chunk):
+        data = self.buffer + chunk
+        n = split_blocks(data, False)
+        out = bytearray()
+        prev = self.prev
+        for i in range(0, n, 16):
+            prev = self.encrypt_block(parallel.xor_bytes(data[i:i + 16], prev))
+            out += prev
+        self.prev = prev
+        self.buffer = data[n:]
+        return bytes(out)
+
+    def finalize(self):
+        data = pkcs7_pad(self.buffer)
+        self.buffer = b""
+        return self.update(data)
+
+# CBC decryption has no serial dependency, so each update decrypts all of its
+# blocks as one batch (and across processes when workers > 1)
+class CBCDecryptor:
+    def __init__(self, key, iv, engine=parallel.default_engine, unpad=True, workers=1):
+        self.key = key
+        self.engine = engine
+        self.workers = workers
+        self.prev = iv
+        self.unpad = unpad
+        self.buffer = b""
+
+    def update(self, chunk):
+        data = self.buffer + chunk
+        n = split_blocks(data, self.unpad)
+        out = parallel.cbc_decrypt(data[:n], self.key, self.prev, self.engine, self.workers)
+        if n:
+            self.prev = int.from_bytes(data[n - 16:n], 'big')
+        self.buffer = data[n:]
+        return out
+
+    def finalize(self):
+        if len(self.buffer) % 16:
+            raise ValueError("Ciphertext length is not a multiple of 16 bytes")
+        unpad, self.unpad = self.unpad, False
+        last = self.update(b"")
+        return pkcs7_unpad(last) if unpad else last
+
+class CTRCipher:
+    def __init__(self, key, iv, engine=parallel.default_engine, workers=1, pad=True, decrypt=False):
+        self.key = key
+        self.iv = iv
+        self.engine = engine
+        self.workers = workers
+        self.pad = pad
+        self.decrypt = decrypt
+        self.blocks_done = 0
+        self.buffer = b""
+
+    def update(self, chunk):
+        data = self.buffer + chunk
+        n = split_blocks(data, self.pad and self.decrypt)
+        if n == 0:
+            self.buffer = data
+            return b""
+        counter = (self.iv + self.blocks_done) % (1 << 128)
+        keystream = b"".join(parallel.ctr_keystream(self.key, counter, n // 16, self.engine, self.workers))
+        self.blocks_done += n // 16
+        self.buffer = data[n:]
+        return parallel.xor_bytes(data[:n], keystream)
+
+    def finalize(self):
+        if not self.pad:
+            # Unpadded CTR may end on a partial block
+            data, self.buffer = self.buffer, b""
+            if not data:
+                return b""
+            counter = (self.iv + self.blocks_done) % (1 << 128)
+            keystream = b"".join(parallel.ctr_keystream(self.key, counter, 1, self.engine, 1))
+            return parallel.xor_bytes(data, keystream[:len(data)])
+        if self.decrypt:
+            if len(self.buffer) % 16:
+                raise ValueError("Ciphertext length is not a multiple of 16 bytes")
+            self.pad = False
+            return pkcs7_unpad(self.update(b""))
+        data = pkcs7_pad(self.buffer)
+        self.buffer = b""
+        return self.update(data)
+
+def encryptor(mode, key, iv, engine=None, workers=1, aad=b""):
+    if mode == "cbc":
+        return CBCEncryptor(key, iv, engine or parallel.default_engine)
+    if mode == "gcm":
+        return gcm.GCMEncryptor(defs.AES(key, engine or parallel.default_engine, workers), iv, aad)
+    if mode == "ctr":
+        return CTRCipher(key, iv, engine or parallel.default_engine, workers)
+    raise ValueError(f"Unknown mode {mode}")
+
+def decryptor(mode, key, iv, engine=None, workers=1, unpad=True, aad=b""):
+    if mode == "cbc":
+        return CBCDecryptor(key, iv, engine or parallel.default_engine, unpad, workers)
+    if mode == "gcm":
+        return gcm.GCMDecryptor(defs.AES(key, engine or parallel.default_engine, workers), iv, aad)
+    if mode == "ctr":
+        return CTRCipher(key, iv, engine or parallel.default_engine, workers, pad=unpad, decrypt=True)
+    raise ValueError(f"Unknown mode {mode}")
+
+def iv_size(mode):
+    return gcm.nonce_size if mode == "gcm" else 16
+
+# One message for the socket: IV || ciphertext (|| tag). cipher is a
+# 2005089_aes_defs.AES; aad is only authenticated in "gcm" mode.
+def encrypt_packet(cipher, mode, data, aad=b""):
+    iv = int.from_bytes(os.urandom(iv_size(mode)), 'big')
+    if mode == "gcm":
+        body = cipher.encrypt_gcm(data, iv, aad)
+    elif mode == "ctr":
+        body = cipher.encrypt_ctr(data, iv)
+    elif mode == "cbc":
+        body = cipher.encrypt_cbc(data, iv)
+    else:
+        raise ValueError(f"Unknown mode {mode}")
+    return iv.to_bytes(iv_size(mode), 'big') + body
+
+def decrypt_packet(cipher, mode, packet, aad=b""):
+    size = iv_size(mode)
+    iv = int.from_bytes(packet[:size], 'big')
+    if mode == "gcm":
+        return cipher.decrypt_gcm(packet[size:], iv, aad)
+    if mode == "ctr":
+        return cipher.decrypt_ctr(packet[size:], iv)
+    if mode == "cbc":
+        return cipher.decrypt_cbc(packet[size:], iv)
+    raise ValueError(f"Unknown mode {mode}")
+
+# encrypt_packet piece by piece: the IV, then whatever each chunk of `chunks`
+# encrypts to, then the final block(s) and GCM tag. Joined, the pieces are
+# exactly an encrypt_packet packet.
+def packet_chunks(cipher, mode, chunks, aad=b""):
+    iv = int.from_bytes(os.urandom(iv_size(mode)), 'big')
+    if mode == "ctr":
+        # packet CTR is unpadded, and unpadded CTR is the same XOR both ways
+        enc = cipher.decryptor(mode, iv, unpad=False)
+    else:
+        enc = cipher.encryptor(mode, iv, aad)
+    yield iv.to_bytes(iv_size(mode), 'big')
+    for chunk in chunks:
+        out = enc.update(chunk)
+        if out:
+            yield out
+    yield enc.finalize()
+
+# decrypt_packet for a packet that arrives in pieces; the IV may be split
+# across them. GCM plaintext is only authentic once finalize() returns.
+class PacketDecryptor:
+    def __init__(self, cipher, mode, aad=b""):
+        self.cipher = cipher
+        self.mode = mode
+        self.aad = aad
+        self.head = b""
+        self.dec = None
+
+    def update(self, chunk):
+        if self.dec is None:
+            data = self.head + chunk
+            size = iv_size(self.mode)
+            if len(data) < size:
+                self.head = data
+                return b""
+            iv = int.from_bytes(data[:size], 'big')
+            self.dec = self.cipher.decryptor(self.mode, iv, unpad=self.mode != "ctr", aad=self.aad)
+            chunk = data[size:]
+        return self.dec.update(chunk)
+
+    def finalize(self):
+        if self.dec is None:
+            raise ValueError("Packet is shorter than its IV")
+        return self.dec.finalize()
+
+# Runs `items` on a producer thread at most `depth` items ahead of the
+# consumer, so producing item N + 1 overlaps with consuming item N and at
+# most depth + 2 items exist at once. An exception in the producer is raised
+# in the consumer; a consumer that stops early stops the producer.
+def pipelined(items, depth):
+    slots = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(entry):
+        while not stop.is_set():
+            try:
+                slots.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not put((True, item)):
+                    return
+            put((False, None))
+        except BaseException as e:
+            put((False, e))
+
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            ok, item = slots.get()
+            if not ok:
+                if item is not None:
+                    raise item
+                return
+            yield item
+    finally:
+        stop.set()
+
+def copy_stream(fin, fout, cipher, size):
+    while True:
+        chunk = fin.read(size)
+        if not chunk:
+            break
+        fout.write(cipher.update(chunk))
+    fout.write(cipher.finalize())
+
+def encrypt_file(src, dst, key, mode="cbc", engine=None, iv=None, workers=1, size=chunk_size):
+    if iv is None:
+        iv = int.from_bytes(os.urandom(iv_size(mode)), 'big')
+    with open(src, "rb") as fin, open(dst, "wb") as fout:
+        fout.write(iv.to_bytes(iv_size(mode), 'big'))
+        copy_stream(fin, fout, encryptor(mode, key, iv, engine, workers), size)
+
+# Chunks are written before the GCM tag (or CBC padding) is checked at the
+# end, so they go to a temporary file that only replaces dst once finalize()
+# succeeds, and is deleted otherwise
+def decrypt_file(src, dst, key, mode="cbc", engine=None, workers=1, size=chunk_size):
+    tmp = dst + ".part"
+    try:
+        with open(src, "rb") as fin, open(tmp, "wb") as fout:
+            iv = int.from_bytes(fin.read(iv_size(mode)), 'big')
+            copy_stream(fin, fout, decryptor(mode, key, iv, engine, workers), size)
+        os.replace(tmp, dst)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
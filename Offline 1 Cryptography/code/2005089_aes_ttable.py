@@ -0,0 +1,170 @@
+import importlib
+from BitVector import BitVector # type: ignore
+bvd = importlib.import_module('2005089_bitvector-demo')
+gf = importlib.import_module('2005089_gf_tables')
+
+# T-table engine for the cipher defined in 2005089_aes_defs.
+#
+# The state is kept as four 32-bit row words (row i = bytes i, 4+i, 8+i, 12+i
+# of the block, which is the layout create_matrix builds). mix_column in
+# 2005089_aes_defs computes state x Mixer, so the mixing runs along rows, and
+# one round of a row is four table lookups and four XORs.
+#
+# Decryption uses the equivalent inverse cipher (FIPS-197 5.3.5): InvMix is
+# linear, so InvMix(x ^ k) = InvMix(x) ^ InvMix(k). With the middle round keys
+# passed through InvMix once per key, a decryption round is the same four
+# lookups and four XORs as an encryption round.
+
+def rotr(word, n):
+    return ((word >> n) | (word << (32 - n))) & 0xFFFFFFFF
+
+def pack(b0, b1, b2, b3):
+    return (b0 << 24) | (b1 << 16) | (b2 << 8) | b3
+
+# Te0[x] = (2.S[x], 3.S[x], S[x], S[x]), the contribution of one byte to its row
+# after SubBytes and MixColumns. TeN is Te0 rotated right by N bytes.
+M2, M3 = gf.MUL[2], gf.MUL[3]
+Te0 = [pack(M2[s], M3[s], s, s) for s in bvd.Sbox]
+Te1 = [rotr(w, 8) for w in Te0]
+Te2 = [rotr(w, 16) for w in Te0]
+Te3 = [rotr(w, 24) for w in Te0]
+
+Sbox = bvd.Sbox
+InvSbox = bvd.InvSbox
+
+# Td0[x] = (14.S'[x], 11.S'[x], 13.S'[x], 9.S'[x]) with S' = InvSbox: one byte
+# of a row through InvSubBytes and InvMixColumns.
+M9, M11, M13, M14 = gf.MUL[9], gf.MUL[11], gf.MUL[13], gf.MUL[14]
+Td0 = [pack(M14[s], M11[s], M13[s], M9[s]) for s in InvSbox]
+Td1 = [rotr(w, 8) for w in Td0]
+Td2 = [rotr(w, 16) for w in Td0]
+Td3 = [rotr(w, 24) for w in Td0]
+
+def block_to_rows(block):
+    return [pack(block[i], block[4 + i], block[8 + i], block[12 + i]) for i in range(4)]
+
+def rows_to_block(rows):
+    out = bytearray(16)
+    for i in range(4):
+        r = rows[i]
+        out[i] = r >> 24
+        out[4 + i] = (r >> 16) & 0xFF
+        out[8 + i] = (r >> 8) & 0xFF
+        out[12 + i] = r & 0xFF
+    return bytes(out)
+
+# Same schedule as generate_r_key, including the rotated w3 that BitVector's
+# in-place << leaves behind for w7.
+def expand_key(key):
+    if isinstance(key, int):
+        key = key.to_bytes(16, 'big')
+    words = [int.from_bytes(key[i:i + 4], 'big') for i in range(0, 16, 4)]
+    schedule = [words]
+    rc = 0x01
+    for _ in range(10):
+        w0, w1, w2, w3 = schedule[-1]
+        w3 = ((w3 << 8) | (w3 >> 24)) & 0xFFFFFFFF
+        g = pack(Sbox[w3 >> 24], Sbox[(w3 >> 16) & 0xFF], Sbox[(w3 >> 8) & 0xFF], Sbox[w3 & 0xFF]) ^ (rc << 24)
+        w4 = w0 ^ g
+        w5 = w4 ^ w1
+        w6 = w5 ^ w2
+        w7 = w6 ^ w3
+        schedule.append([w4, w5, w6, w7])
+        rc = gf.xtime(rc)
+    return [block_to_rows(b''.join(w.to_bytes(4, 'big') for w in words)) for words in schedule]
+
+# InvMixColumns of one row word; Sbox cancels the InvSbox inside Td
+def inv_mix_row(r):
+    return Td0[Sbox[r >> 24]] ^ Td1[Sbox[(r >> 16) & 0xFF]] ^ Td2[Sbox[(r >> 8) & 0xFF]] ^ Td3[Sbox[r & 0xFF]]
+
+# Decryption schedule for the equivalent inverse cipher: the round keys in
+# reverse order, with InvMix applied to all but the first and last
+def inverse_key(round_keys):
+    reverse = round_keys[::-1]
+    return [reverse[0]] + [[inv_mix_row(w) for w in k] for k in reverse[1:10]] + [reverse[10]]
+
+def encrypt_rows(r0, r1, r2, r3, round_keys):
+    k = round_keys[0]
+    r0 ^= k[0]; r1 ^= k[1]; r2 ^= k[2]; r3 ^= k[3]
+    for rnd in range(1, 10):
+        k = round_keys[rnd]
+        # Row i is rotated left by i bytes before mixing
+        t0 = Te0[r0 >> 24] ^ Te1[(r0 >> 16) & 0xFF] ^ Te2[(r0 >> 8) & 0xFF] ^ Te3[r0 & 0xFF] ^ k[0]
+        t1 = Te0[(r1 >> 16) & 0xFF] ^ Te1[(r1 >> 8) & 0xFF] ^ Te2[r1 & 0xFF] ^ Te3[r1 >> 24] ^ k[1]
+        t2 = Te0[(r2 >> 8) & 0xFF] ^ Te1[r2 & 0xFF] ^ Te2[r2 >> 24] ^ Te3[(r2 >> 16) & 0xFF] ^ k[2]
+        t3 = Te0[r3 & 0xFF] ^ Te1[r3 >> 24] ^ Te2[(r3 >> 16) & 0xFF] ^ Te3[(r3 >> 8) & 0xFF] ^ k[3]
+        r0, r1, r2, r3 = t0, t1, t2, t3
+    # Last round has no MixColumns
+    k = round_keys[10]
+    S = Sbox
+    t0 = pack(S[r0 >> 24], S[(r0 >> 16) & 0xFF], S[(r0 >> 8) & 0xFF], S[r0 & 0xFF]) ^ k[0]
+    t1 = pack(S[(r1 >> 16) & 0xFF], S[(r1 >> 8) & 0xFF], S[r1 & 0xFF], S[r1 >> 24]) ^ k[1]
+    t2 = pack(S[(r2 >> 8) & 0xFF], S[r2 & 0xFF], S[r2 >> 24], S[(r2 >> 16) & 0xFF]) ^ k[2]
+    t3 = pack(S[r3 & 0xFF], S[r3 >> 24], S[(r3 >> 16) & 0xFF], S[(r3 >> 8) & 0xFF]) ^ k[3]
+    return t0, t1, t2, t3
+
+# decrypt_keys from inverse_key
+def decrypt_rows(r0, r1, r2, r3, decrypt_keys):
+    k = decrypt_keys[0]
+    r0 ^= k[0]; r1 ^= k[1]; r2 ^= k[2]; r3 ^= k[3]
+    for rnd in range(1, 10):
+        k = decrypt_keys[rnd]
+        # Row i is rotated right by i bytes before the inverse mix
+        t0 = Td0[r0 >> 24] ^ Td1[(r0 >> 16) & 0xFF] ^ Td2[(r0 >> 8) & 0xFF] ^ Td3[r0 & 0xFF] ^ k[0]
+        t1 = Td0[r1 & 0xFF] ^ Td1[r1 >> 24] ^ Td2[(r1 >> 16) & 0xFF] ^ Td3[(r1 >> 8) & 0xFF] ^ k[1]
+        t2 = Td0[(r2 >> 8) & 0xFF] ^ Td1[r2 & 0xFF] ^ Td2[r2 >> 24] ^ Td3[(r2 >> 16) & 0xFF] ^ k[2]
+        t3 = Td0[(r3 >> 16) & 0xFF] ^ Td1[(r3 >> 8) & 0xFF] ^ Td2[r3 & 0xFF] ^ Td3[r3 >> 24] ^ k[3]
+        r0, r1, r2, r3 = t0, t1, t2, t3
+    # Last round has no InvMixColumns
+    k = decrypt_keys[10]
+    S = InvSbox
+    t0 = pack(S[r0 >> 24], S[(r0 >> 16) & 0xFF], S[(r0 >> 8) & 0xFF], S[r0 & 0xFF]) ^ k[0]
+    t1 = pack(S[r1 & 0xFF], S[r1 >> 24], S[(r1 >> 16) & 0xFF], S[(r1 >> 8) & 0xFF]) ^ k[1]
+    t2 = pack(S[(r2 >> 8) & 0xFF], S[r2 & 0xFF], S[r2 >> 24], S[(r2 >> 16) & 0xFF]) ^ k[2]
+    t3 = pack(S[(r3 >> 16) & 0xFF], S[(r3 >> 8) & 0xFF], S[r3 & 0xFF], S[r3 >> 24]) ^ k[3]
+    return t0, t1, t2, t3
+
+def encrypt_block(block, round_keys):
+    return rows_to_block(encrypt_rows(*block_to_rows(block), round_keys))
+
+def decrypt_block(block, decrypt_keys):
+    return rows_to_block(decrypt_rows(*block_to_rows(block), decrypt_keys))
+
+def encrypt_int(value, round_keys):
+    return int.from_bytes(encrypt_block(value.to_bytes(16, 'big'), round_keys), 'big')
+
+def decrypt_int(value, decrypt_keys):
+    return int.from_bytes(decrypt_block(value.to_bytes(16, 'big'), decrypt_keys), 'big')
+
+# BitVector adapters for the existing drivers
+def encrypt_bitvector(bv, round_keys):
+    return BitVector(intVal=encrypt_int(bv.intValue(), round_keys), size=128)
+
+def decrypt_bitvector(bv, decrypt_keys):
+    return BitVector(intVal=decrypt_int(bv.intValue(), decrypt_keys), size=128)
+
+# Cross-check against the BitVector implementation in 2005089_aes_defs
+def self_check(trials=20):
+    import os
+    defs = importlib.import_module('2005089_aes_defs')
+    for _ in range(trials):
+        key = os.urandom(16)
+        block = os.urandom(16)
+        rcons = defs.generate_r_constant()
+        bv_keys = [BitVector(rawbytes=key)]
+        for i in range(10):
+            bv_keys.append(defs.generate_r_key(bv_keys[-1], rcons[i]))
+        state = defs.create_matrix(BitVector(rawbytes=block))
+        state = defs.xor_round_key(state, defs.create_matrix(bv_keys[0]))
+        for rnd in range(10):
+            state = defs.encrypte(state, defs.create_matrix(bv_keys[rnd + 1]), rnd)
+        expected = defs.create_bitvector(state).intValue().to_bytes(16, 'big')
+        round_keys = expand_key(key)
+        if encrypt_block(block, round_keys) != expected:
+            return False
+        if decrypt_block(expected, inverse_key(round_keys)) != block:
+            return False
+    return True
+
+if __name__ == "__main__":
+    print("T-table engine matches reference:", self_check())
@@ -0,0 +1,114 @@
+import argparse
+import importlib
+import json
+import os
+import random
+import threading
+import Crypto.Util.number # type: ignore
+
+ecdh = importlib.import_module('2005089_ecdh_defs')
+
+# Curve parameters generated ahead of time, so a handshake never waits on
+# getPrime. Curves are kept per key size in a JSON file next to the scripts
+# and topped up by a background thread; run this file directly to fill the
+# pool from a separate process:
+#
+#   python 2005089_curve_pool.py --bits 128 192 256 --size 8
+
+pool_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "2005089_curve_pool.json")
+pool_size = 8
+
+# secp128r1, NIST P-192 and NIST P-256: (a, b, G, p)
+standard_curves = {
+    128: (0xfffffffdfffffffffffffffffffffffc, 0xe87579c11079f43dd824993c2cee5ed3,
+          (0x161ff7528b899b2d0c28607ca52c5b86, 0xcf5ac8395bafeb13c02da292dded7a83),
+          0xfffffffdffffffffffffffffffffffff),
+    192: (0xfffffffffffffffffffffffffffffffefffffffffffffffc, 0x64210519e59c80e70fa7e9ab72243049feb8deecc146b9b1,
+          (0x188da80eb03090f67cbf20eb43a18800f4ff0afd82ff1012, 0x07192b95ffc8da78631011ed6b24cdd573f977a11e794811),
+          0xfffffffffffffffffffffffffffffffeffffffffffffffff),
+    256: (0xffffffff00000001000000000000000000000000fffffffffffffffffffffffc,
+          0x5ac635d8aa3a93e7b3ebbd55769886bc651d06b0cc53b0f63bce3c3e27d2604b,
+          (0x6b17d1f2e12c4247f8bce6e563a440f277037d812deb33a0f4a13945d898c296,
+           0x4fe342e2fe1a7f9b8ee7eb4a7c0f9e162bce33576b315ececbb6406837bf51f5),
+          0xffffffff00000001000000000000000000000000ffffffffffffffffffffffff),
+}
+
+# Entries read back from the file are checked before use
+def valid_curve(a, b, g, p):
+    if not Crypto.Util.number.isPrime(p) or (4 * a**3 + 27 * b**2) % p == 0:
+        return False
+    return (g[1]**2 - g[0]**3 - a * g[0] - b) % p == 0
+
+def load_pool(path=pool_path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_pool(pool, path=pool_path):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(pool, f)
+    os.replace(tmp, path)
+
+class CurvePool:
+    def __init__(self, key_bits=128, size=pool_size, path=pool_path, standard=False):
+        self.key_bits = key_bits
+        self.size = size
+        self.path = path
+        self.standard = standard
+        self.lock = threading.Lock()
+        self.worker = None
+        stored = load_pool(path).get(str(key_bits), [])
+        self.curves = [(a, b, tuple(g), p) for a, b, g, p in stored if valid_curve(a, b, g, p)]
+
+    # A ready curve; only generates on the spot if the pool is still empty
+    def get(self):
+        if self.standard:
+            return standard_curves[self.key_bits]
+        with self.lock:
+            if self.curves:
+                return random.choice(self.curves)
+        curve = ecdh.generate_curve_params(self.key_bits)
+        self.add(curve)
+        return curve
+
+    def add(self, curve):
+        with self.lock:
+            self.curves.append(curve)
+            # Re-read so curves added by another process are kept
+            pool = load_pool(self.path)
+            stored = pool.setdefault(str(self.key_bits), [])
+            stored.append([curve[0], curve[1], list(curve[2]), curve[3]])
+            save_pool(pool, self.path)
+
+    def missing(self):
+        with self.lock:
+            return max(self.size - len(self.curves), 0)
+
+    # Top the pool up to `size` curves on a daemon thread
+    def fill(self):
+        if self.standard or self.missing() == 0 or (self.worker and self.worker.is_alive()):
+            return
+        self.worker = threading.Thread(target=self.generate, daemon=True)
+        self.worker.start()
+
+    def generate(self):
+        for _ in range(self.missing()):
+            self.add(ecdh.generate_curve_params(self.key_bits))
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-generate ECDH curve parameters")
+    parser.add_argument("--bits", nargs="+", type=int, default=[128])
+    parser.add_argument("--size", type=int, default=pool_size)
+    parser.add_argument("--path", default=pool_path)
+    args = parser.parse_args()
+    for bits in args.bits:
+        pool = CurvePool(bits, args.size, args.path)
+        count = pool.missing()
+        pool.generate()
+        print(f"{bits}-bit curves: {len(pool.curves)} in pool ({count} generated)")
+
+if __name__ == "__main__":
+    main()
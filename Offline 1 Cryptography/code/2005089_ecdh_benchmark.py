@@ -0,0 +1,125 @@
+import argparse
+import concurrent.futures
+import importlib
+import json
+import os
+import random
+import statistics
+import time
+from prettytable import PrettyTable # type: ignore
+
+ecdh = importlib.import_module("2005089_ecdh_defs")
+aes_benchmark = importlib.import_module("2005089_aes_benchmark")
+
+# ECDH handshake benchmark. Every trial generates a curve and two private
+# keys, then times each phase on its own:
+#   curve  - generate_curve_params
+#   keygen - k.G for one party, per scalar multiplication method (Alice and
+#            Bob are separate samples, so table building shows in p95)
+#   shared - x of k.Q for one party, per method (plus the x-only ladder)
+# Private keys are drawn outside the timed regions. Trials are spread over a
+# process pool; each trial stays inside one process, so the per-curve tables
+# (comb, w-NAF) are built in the first keygen of that curve, as in a real
+# handshake on a fresh curve.
+#
+#   python 2005089_ecdh_benchmark.py --json ecdh_bench.json
+#   python 2005089_ecdh_benchmark.py --sizes 256 384 --keygen comb --shared ladder --trials 50
+
+default_sizes = [128, 192, 256, 384, 512]
+keygen_methods = ecdh.methods
+shared_methods = ecdh.methods + ("ladder",)
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+# One trial on one fresh curve: {(phase, method): [seconds, ...]}
+def run_trial(key_bits, keygen, shared, seed):
+    rng = random.Random(seed)
+    (a, b, g, p), elapsed = timed(ecdh.generate_curve_params, key_bits)
+    times = {("curve", "-"): [elapsed]}
+    ka = rng.getrandbits(key_bits) | (1 << (key_bits - 1))
+    kb = rng.getrandbits(key_bits) | (1 << (key_bits - 1))
+    public_b = None
+    for method in keygen:
+        public_a, elapsed_a = timed(ecdh.scalar_mult, ka, g, a, p, method)
+        public_b, elapsed_b = timed(ecdh.scalar_mult, kb, g, a, p, method)
+        times[("keygen", method)] = [elapsed_a, elapsed_b]
+    if public_b is None:
+        public_b = ecdh.scalar_mult(kb, g, a, p)
+    expected = None
+    for method in shared:
+        secret, elapsed = timed(ecdh.shared_x, ka, public_b, a, p, method)
+        if expected is None:
+            expected = secret
+        elif secret != expected:
+            raise ValueError(f"{method} shared secret disagrees at {key_bits} bits")
+        times[("shared", method)] = [elapsed]
+    return key_bits, times
+
+def summarize(samples):
+    samples = sorted(samples)
+    return {
+        "samples": len(samples),
+        "mean_ms": statistics.fmean(samples) * 1000,
+        "p50_ms": aes_benchmark.percentile(samples, 50) * 1000,
+        "p95_ms": aes_benchmark.percentile(samples, 95) * 1000,
+        "stddev_ms": (statistics.stdev(samples) if len(samples) > 1 else 0.0) * 1000,
+    }
+
+def run_benchmarks(sizes, keygen=keygen_methods, shared=shared_methods, trials=10, workers=None, log=print):
+    tasks = [(bits, tuple(keygen), tuple(shared), random.getrandbits(64)) for bits in sizes for _ in range(trials)]
+    samples = {}
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run_trial, *task) for task in tasks]
+        for done, future in enumerate(concurrent.futures.as_completed(futures), 1):
+            key_bits, times = future.result()
+            for key, elapsed in times.items():
+                samples.setdefault((key_bits,) + key, []).extend(elapsed)
+            if log and done % max(len(tasks) // 10, 1) == 0:
+                log(f"  {done}/{len(tasks)} trials")
+    phase_order = {"curve": 0, "keygen": 1, "shared": 2}
+    results = []
+    for key_bits, phase, method in sorted(samples, key=lambda key: (key[0], phase_order[key[1]], key[2])):
+        result = summarize(samples[(key_bits, phase, method)])
+        result.update(key_bits=key_bits, phase=phase, method=method)
+        results.append(result)
+    return results
+
+def results_table(results):
+    table = PrettyTable()
+    table.field_names = ["Key Size (bits)", "Phase", "Method", "Mean (ms)", "p50 (ms)", "p95 (ms)", "Stddev (ms)"]
+    for r in results:
+        table.add_row([
+            r["key_bits"], r["phase"], r["method"],
+            round(r["mean_ms"], 4), round(r["p50_ms"], 4), round(r["p95_ms"], 4), round(r["stddev_ms"], 4),
+        ])
+    return table
+
+def main():
+    parser = argparse.ArgumentParser(description="ECDH curve generation / keygen / shared secret benchmark")
+    parser.add_argument("--sizes", nargs="+", type=int, default=default_sizes)
+    parser.add_argument("--keygen", nargs="*", default=list(keygen_methods), choices=list(keygen_methods))
+    parser.add_argument("--shared", nargs="*", default=list(shared_methods), choices=list(shared_methods))
+    parser.add_argument("--trials", type=int, default=10, help="curves per key size")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="process pool size")
+    parser.add_argument("--json", help="write machine-readable results to this file")
+    args = parser.parse_args()
+
+    print("=== ECDH Benchmark ===")
+    print(f"{args.trials} trials per key size on {args.workers} worker(s)")
+    results = run_benchmarks(args.sizes, args.keygen, args.shared, args.trials, args.workers)
+
+    print("\n=== Results ===")
+    print(results_table(results))
+
+    if args.json:
+        machine = aes_benchmark.machine_info()
+        machine["workers"] = args.workers
+        with open(args.json, "w") as f:
+            json.dump({"machine": machine, "results": results}, f, indent=2)
+        print(f"\nJSON written to: {args.json}")
+
+if __name__ == "__main__":
+    main()
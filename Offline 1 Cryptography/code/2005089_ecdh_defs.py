@@ -1,19 +1,13 @@
+import functools
+import importlib
 import Crypto.Util.number
 
-def gcd(a, b):
-    return a if b == 0 else gcd(b, a % b)
-
-def mod_pow(base, exponent, modulus):
-    if exponent == 0:
-        return 1
-    half = mod_pow(base, exponent // 2, modulus) % modulus
-    result = (half * half) % modulus
-    return (base * result) % modulus if exponent % 2 else result 
-
-def mod_inverse(a, modulus):
-    if gcd(a, modulus) != 1:
-        raise ValueError(f"No modular inverse for {a} mod {modulus}")
-    return mod_pow(a, modulus - 2, modulus) 
+# gcd, mod_pow and mod_inverse live in 2005089_modular (iterative, and
+# inversion is pow(a, -1, p)); the names are kept here for the callers
+modular = importlib.import_module('2005089_modular')
+gcd = modular.gcd
+mod_pow = modular.mod_pow
+mod_inverse = modular.mod_inverse
 
 def generate_curve_params(key_bits):
     while True:
@@ -47,4 +41,363 @@ def ecc_scalar_mult(k, point, a, p):
             result = ecc_point_double(result, a, p)
         if bit == "1" and result != point:
             result = ecc_point_add(result, point, p)
-    return result
\ No newline at end of file
+    return result
+
+# SEC1 point encoding. Compressed: 0x02 / 0x03 (parity of y) || x, with y
+# recovered by a modular square root; uncompressed: 0x04 || x || y. Both use
+# fixed-width big-endian coordinates, and infinity is the single byte 0x00.
+def field_size(p):
+    return (p.bit_length() + 7) // 8
+
+def encode_point(point, p, compressed=True):
+    if point is None:
+        return b"\x00"
+    n = field_size(p)
+    x, y = point[0] % p, point[1] % p
+    if compressed:
+        return bytes([2 | (y & 1)]) + x.to_bytes(n, 'big')
+    return b"\x04" + x.to_bytes(n, 'big') + y.to_bytes(n, 'big')
+
+# The result is checked to lie on y^2 = x^3 + ax + b
+def decode_point(data, a, b, p):
+    n = field_size(p)
+    if data == b"\x00":
+        return None
+    if len(data) == n + 1 and data[0] in (2, 3):
+        x = int.from_bytes(data[1:], 'big')
+        if x >= p:
+            raise ValueError("Point x is not reduced mod p")
+        y = modular.mod_sqrt(x**3 + a * x + b, p)  # raises if x is not on the curve
+        if y & 1 != data[0] & 1:
+            y = (p - y) % p
+        return (x, y)
+    if len(data) == 2 * n + 1 and data[0] == 4:
+        x, y = int.from_bytes(data[1:n + 1], 'big'), int.from_bytes(data[n + 1:], 'big')
+        if x >= p or y >= p or (y * y - x**3 - a * x - b) % p:
+            raise ValueError("Point is not on the curve")
+        return (x, y)
+    raise ValueError(f"Bad point encoding ({len(data)} bytes, prefix {data[:1].hex()})")
+
+# Jacobian coordinates: (X, Y, Z) stands for the affine point (X/Z^2, Y/Z^3)
+# and Z = 0 is the point at infinity. Doubling and addition need no inversion,
+# so a whole scalar multiplication does one mod_inverse at the end. The affine
+# functions above stay as the reference.
+INFINITY = (1, 1, 0)
+
+def to_jacobian(point, p):
+    if point is None:
+        return INFINITY
+    return (point[0] % p, point[1] % p, 1)
+
+def from_jacobian(point, p):
+    X, Y, Z = point
+    if Z == 0:
+        return None
+    z_inv = mod_inverse(Z, p)
+    z_inv2 = z_inv * z_inv % p
+    return (X * z_inv2 % p, Y * z_inv2 * z_inv % p)
+
+# from_jacobian for a list of points with a single batched inversion
+def normalize(points, p):
+    z_invs = iter(modular.batch_inverse([Z for _, _, Z in points if Z], p))
+    out = []
+    for X, Y, Z in points:
+        if Z == 0:
+            out.append(None)
+            continue
+        z_inv = next(z_invs)
+        z_inv2 = z_inv * z_inv % p
+        out.append((X * z_inv2 % p, Y * z_inv2 * z_inv % p))
+    return out
+
+def jacobian_double(point, a, p):
+    X, Y, Z = point
+    if Z == 0 or Y == 0:
+        return INFINITY
+    YY = Y * Y % p
+    S = 4 * X * YY % p
+    M = (3 * X * X + a * pow(Z, 4, p)) % p
+    X3 = (M * M - 2 * S) % p
+    Y3 = (M * (S - X3) - 8 * YY * YY) % p
+    Z3 = 2 * Y * Z % p
+    return (X3, Y3, Z3)
+
+def jacobian_add(p1, p2, a, p):
+    X1, Y1, Z1 = p1
+    X2, Y2, Z2 = p2
+    if Z1 == 0:
+        return p2
+    if Z2 == 0:
+        return p1
+    Z1Z1 = Z1 * Z1 % p
+    Z2Z2 = Z2 * Z2 % p
+    U1 = X1 * Z2Z2 % p
+    U2 = X2 * Z1Z1 % p
+    S1 = Y1 * Z2 * Z2Z2 % p
+    S2 = Y2 * Z1 * Z1Z1 % p
+    if U1 == U2:
+        # same x: either P + P or P + (-P)
+        return jacobian_double(p1, a, p) if S1 == S2 else INFINITY
+    H = (U2 - U1) % p
+    R = (S2 - S1) % p
+    HH = H * H % p
+    HHH = H * HH % p
+    V = U1 * HH % p
+    X3 = (R * R - HHH - 2 * V) % p
+    Y3 = (R * (V - X3) - S1 * HHH) % p
+    Z3 = H * Z1 * Z2 % p
+    return (X3, Y3, Z3)
+
+# Mixed addition: p2 is affine (Z2 = 1), which saves four multiplications
+def jacobian_add_affine(p1, p2, a, p):
+    X1, Y1, Z1 = p1
+    if p2 is None:
+        return p1
+    if Z1 == 0:
+        return to_jacobian(p2, p)
+    Z1Z1 = Z1 * Z1 % p
+    U2 = p2[0] * Z1Z1 % p
+    S2 = p2[1] * Z1 * Z1Z1 % p
+    if X1 == U2:
+        return jacobian_double(p1, a, p) if Y1 == S2 else INFINITY
+    H = (U2 - X1) % p
+    R = (S2 - Y1) % p
+    HH = H * H % p
+    HHH = H * HH % p
+    V = X1 * HH % p
+    X3 = (R * R - HHH - 2 * V) % p
+    Y3 = (R * (V - X3) - Y1 * HHH) % p
+    Z3 = H * Z1 % p
+    return (X3, Y3, Z3)
+
+# Left-to-right double-and-add. The *_jacobian_result functions stop before
+# the final inversion so several results can share one (see normalize).
+def double_and_add_jacobian_result(k, point, a, p):
+    base = (point[0] % p, point[1] % p)
+    result = INFINITY
+    for bit in bin(k)[2:]:
+        result = jacobian_double(result, a, p)
+        if bit == "1":
+            result = jacobian_add_affine(result, base, a, p)
+    return result
+
+# Returns an affine point, or None for infinity
+def ecc_scalar_mult_jacobian(k, point, a, p):
+    return from_jacobian(double_and_add_jacobian_result(k, point, a, p), p)
+
+# Width-w NAF of k, least significant digit first. Every nonzero digit is
+# odd with |d| < 2^(w-1), and any w consecutive digits hold at most one
+# nonzero, so about n / (w + 1) additions are left instead of n / 2.
+def wnaf(k, width):
+    digits = []
+    while k:
+        if k & 1:
+            d = k & ((1 << width) - 1)
+            if d >= 1 << (width - 1):
+                d -= 1 << width
+            k -= d
+        else:
+            d = 0
+        digits.append(d)
+        k >>= 1
+    return digits
+
+# P, 3P, 5P, ..., (2^(w-1) - 1)P, kept per point. The table is normalised to
+# affine in one batch so the main loop can use mixed additions.
+@functools.lru_cache(maxsize=32)
+def odd_multiples(point, a, p, width):
+    table = [to_jacobian(point, p)]
+    twice = jacobian_double(table[0], a, p)
+    for _ in range((1 << (width - 2)) - 1):
+        table.append(jacobian_add(table[-1], twice, a, p))
+    return normalize(table, p)
+
+wnaf_width = 4
+
+def wnaf_jacobian_result(k, point, a, p, width=None):
+    width = width or wnaf_width
+    if width < 2:
+        raise ValueError("w-NAF width must be at least 2")
+    table = odd_multiples((point[0] % p, point[1] % p), a, p, width)
+    result = INFINITY
+    for d in reversed(wnaf(k, width)):
+        result = jacobian_double(result, a, p)
+        if d > 0:
+            result = jacobian_add_affine(result, table[d >> 1], a, p)
+        elif d < 0 and table[-d >> 1] is not None:
+            x, y = table[-d >> 1]
+            result = jacobian_add_affine(result, (x, -y % p), a, p)
+    return result
+
+def ecc_scalar_mult_wnaf(k, point, a, p, width=None):
+    return from_jacobian(wnaf_jacobian_result(k, point, a, p, width), p)
+
+# Fixed-base comb (Lim-Lee) for public keys, where the point is always G.
+# A scalar of up to `bits` bits is cut into `width` rows of d = bits / width
+# bits; table[s] = sum of 2^(i*d) G over the set bits i of s. k.G is then d
+# doublings and d additions, against ~bits doublings for a generic point.
+comb_width = 8
+
+@functools.lru_cache(maxsize=16)
+def comb_table(point, a, p, width, bits):
+    d = -(-bits // width)
+    rows = [to_jacobian(point, p)]
+    for _ in range(width - 1):
+        row = rows[-1]
+        for _ in range(d):
+            row = jacobian_double(row, a, p)
+        rows.append(row)
+    table = [INFINITY]
+    for i in range(width):
+        # entries with top bit i are row i plus every entry below 2^i
+        table += [jacobian_add(entry, rows[i], a, p) for entry in table]
+    # affine entries (one batched inversion) for mixed additions
+    return d, normalize(table, p)
+
+def comb_jacobian_result(k, point, a, p, width=None):
+    width = width or comb_width
+    bits = p.bit_length()
+    if k.bit_length() > bits:
+        return wnaf_jacobian_result(k, point, a, p)
+    d, table = comb_table((point[0] % p, point[1] % p), a, p, width, bits)
+    result = INFINITY
+    for j in range(d - 1, -1, -1):
+        result = jacobian_double(result, a, p)
+        s = 0
+        for i in range(width - 1, -1, -1):
+            s = (s << 1) | ((k >> (i * d + j)) & 1)
+        if s:
+            result = jacobian_add_affine(result, table[s], a, p)
+    return result
+
+def ecc_scalar_mult_comb(k, point, a, p, width=None):
+    return from_jacobian(comb_jacobian_result(k, point, a, p, width), p)
+
+# x-only Montgomery ladder (Brier-Joye formulas for y^2 = x^3 + ax + b) on
+# projective (X : Z). R1 - R0 = P throughout, so the addition only needs the
+# affine x of P. Every bit costs one ladder_add and one ladder_double,
+# whatever its value, and y is never computed.
+def ladder_add(X0, Z0, X1, Z1, x, a, b4, p):
+    t1 = X0 * Z1 % p
+    t2 = X1 * Z0 % p
+    t3 = Z0 * Z1 % p
+    d = t1 - t2
+    X = (2 * (t1 + t2) * (X0 * X1 + a * t3) + b4 * t3 * t3 - x * d * d) % p
+    return X, d * d % p
+
+def ladder_double(X, Z, a, b, p):
+    XX = X * X % p
+    ZZ = Z * Z % p
+    aZZ = a * ZZ % p
+    XZ = X * Z % p
+    return ((XX - aZZ) ** 2 - 8 * b * XZ * ZZ) % p, 4 * (XZ * (XX + aZZ) + b * ZZ * ZZ) % p
+
+# x(k.P), or None for infinity; b is recovered from the point itself
+def ecc_shared_x_ladder(k, point, a, p):
+    if k == 0:
+        return None
+    x = point[0] % p
+    a %= p
+    b = (point[1] ** 2 - x ** 3 - a * x) % p
+    b4 = 4 * b % p
+    X0, Z0 = x, 1
+    X1, Z1 = ladder_double(x, 1, a, b, p)
+    for bit in bin(k)[3:]:
+        if bit == "1":
+            X0, Z0, X1, Z1 = X1, Z1, X0, Z0
+        X1, Z1 = ladder_add(X0, Z0, X1, Z1, x, a, b4, p)
+        X0, Z0 = ladder_double(X0, Z0, a, b, p)
+        if bit == "1":
+            X0, Z0, X1, Z1 = X1, Z1, X0, Z0
+    if Z0 == 0:
+        return None
+    return X0 * mod_inverse(Z0, p) % p
+
+# Scalar multiplication used by the drivers; method picks the implementation.
+# fixed_base_method is for public keys (k.G on a curve that is reused).
+methods = ("affine", "jacobian", "wnaf", "comb")
+default_method = "wnaf"
+fixed_base_method = "comb"
+# The shared secret only needs x: "ladder" or any of methods
+shared_method = "ladder"
+
+# k.point left in Jacobian form, for callers that normalise several at once
+def scalar_mult_jacobian(k, point, a, p, method=default_method):
+    if method == "affine":
+        return to_jacobian(ecc_scalar_mult(k, point, a, p), p)
+    if method == "jacobian":
+        return double_and_add_jacobian_result(k, point, a, p)
+    if method == "wnaf":
+        return wnaf_jacobian_result(k, point, a, p)
+    if method == "comb":
+        return comb_jacobian_result(k, point, a, p)
+    raise ValueError(f"Unknown scalar multiplication method {method!r}, expected one of {methods}")
+
+# Builds (and caches) the per-point table that method uses, so a caller can
+# time it apart from the multiplications; methods without a table do nothing
+def precompute(point, a, p, method=default_method):
+    point = (point[0] % p, point[1] % p)
+    if method == "comb":
+        comb_table(point, a, p, comb_width, p.bit_length())
+    elif method == "wnaf":
+        odd_multiples(point, a, p, wnaf_width)
+
+def scalar_mult(k, point, a, p, method=default_method):
+    if method == "affine":
+        return ecc_scalar_mult(k, point, a, p)
+    return from_jacobian(scalar_mult_jacobian(k, point, a, p, method), p)
+
+# k.point for every k in ks, sharing one inversion
+def scalar_mult_many(ks, point, a, p, method=default_method):
+    return normalize([scalar_mult_jacobian(k, point, a, p, method) for k in ks], p)
+
+# x-coordinate of k.point, which is all the AES key derivation uses
+def shared_x(k, point, a, p, method=shared_method):
+    if method == "ladder":
+        return ecc_shared_x_ladder(k, point, a, p)
+    result = scalar_mult(k, point, a, p, method)
+    return None if result is None else result[0]
+
+# Cross-check every method against the affine reference on random curves
+def self_check(trials=5, key_bits=128):
+    for _ in range(trials):
+        a, b, g, p = generate_curve_params(key_bits)
+        k = Crypto.Util.number.getRandomNBitInteger(key_bits)
+        expected = ecc_scalar_mult(k, g, a, p)
+        for method in methods:
+            if scalar_mult(k, g, a, p, method) != expected:
+                return False
+        if shared_x(k, g, a, p, "ladder") != expected[0]:
+            return False
+        ks = [k, k + 1, p - 1]
+        if scalar_mult_many(ks, g, a, p) != [ecc_scalar_mult(x, g, a, p) for x in ks]:
+            return False
+    # Every width, and small scalars where the table is hit directly
+    for width in range(2, 7):
+        for k in (1, 2, 3, 7, 2 ** width - 1, 2 ** width + 1):
+            if ecc_scalar_mult_wnaf(k, g, a, p, width) != ecc_scalar_mult_jacobian(k, g, a, p):
+                return False
+    for width in (1, 3, 8):
+        for k in (1, 2, p - 1, (1 << p.bit_length()) - 1, p << 3):
+            if ecc_scalar_mult_comb(k, g, a, p, width) != ecc_scalar_mult_jacobian(k, g, a, p):
+                return False
+    for k in range(1, 8):
+        if ecc_shared_x_ladder(k, g, a, p) != ecc_scalar_mult_jacobian(k, g, a, p)[0]:
+            return False
+    if ecc_scalar_mult_wnaf(0, g, a, p) is not None or ecc_scalar_mult_comb(0, g, a, p) is not None:
+        return False
+    if ecc_shared_x_ladder(0, g, a, p) is not None:
+        return False
+    # Encoding round trip, both forms and both parities of y
+    for point in (expected, (g[0] % p, g[1] % p), ecc_point_double(g, a, p), None):
+        for compressed in (True, False):
+            if decode_point(encode_point(point, p, compressed), a, b, p) != point:
+                return False
+    # Infinity and doubling: P + (-P), P + P
+    point = (g[0] % p, g[1] % p)
+    if jacobian_add_affine(to_jacobian(point, p), (point[0], -point[1] % p), a, p)[2] != 0:
+        return False
+    return from_jacobian(jacobian_add(to_jacobian(point, p), to_jacobian(point, p), a, p), p) == ecc_point_double(point, a, p)
+
+if __name__ == "__main__":
+    print("All scalar multiplication methods match the affine reference:", self_check())
@@ -0,0 +1,201 @@
+import asyncio
+import struct
+
+# Wire format between sender and receiver: typed, length-prefixed frames
+#
+#   type (1 byte) || payload length (4 bytes, big-endian) || payload
+#
+# Payloads are raw bytes (handshake messages, tickets, IV + ciphertext), never
+# text.
+# A data packet may be split over any number of DATA frames and is closed
+# by an END frame. A connection carries any number of FILENAME + data
+# packets; closing it between frames is a clean end of the session.
+
+HANDSHAKE = 1
+FILENAME = 2
+DATA = 3
+END = 4
+TICKET = 5
+RESUME = 6
+frame_names = {HANDSHAKE: "handshake", FILENAME: "filename", DATA: "data", END: "end",
+               TICKET: "ticket", RESUME: "resume"}
+
+header = struct.Struct(">BI")
+chunk_size = 1 << 20  # DATA frame payload
+max_frame = 1 << 26  # larger DATA frames are refused before any buffering
+# Every other frame is a handshake message, ticket or encrypted filename: a
+# few hundred bytes. The first frame arrives before any authentication, so
+# these stay small.
+max_message = 1 << 16
+frame_limits = {DATA: max_frame}
+
+def check_size(kind, size):
+    if kind not in frame_names:
+        raise ValueError(f"Unknown frame type {kind}")
+    limit = frame_limits.get(kind, max_message)
+    if size > limit:
+        raise ValueError(f"{frame_names[kind]} frame of {size} bytes exceeds {limit}")
+buffer_size = 1 << 21  # receive buffer; grows once if a bigger frame arrives
+
+# Header and payload go out in one write unless the payload is big enough
+# that the copy would cost more than a second send
+def send_frame(sock, kind, payload=b""):
+    if len(payload) <= 1 << 16:
+        sock.sendall(header.pack(kind, len(payload)) + payload)
+    else:
+        sock.sendall(header.pack(kind, len(payload)))
+        sock.sendall(payload)
+
+# One packet given as pieces: a DATA frame per non-empty piece, then END
+def send_chunks(sock, chunks):
+    for chunk in chunks:
+        if chunk:
+            send_frame(sock, DATA, chunk)
+    send_frame(sock, END)
+
+# One packet as DATA frames of at most `size` bytes, then END
+def send_stream(sock, data, size=chunk_size):
+    view = memoryview(data)
+    send_chunks(sock, (view[start:start + size] for start in range(0, len(data), size)))
+
+# Reassembles frames from the socket with recv_into, so bytes are written
+# once into a preallocated buffer and only the finished payload is copied out
+class FrameReader:
+    def __init__(self, sock, size=buffer_size):
+        self.sock = sock
+        self.buf = bytearray(size)
+        self.start = 0  # first unread byte
+        self.end = 0  # end of received bytes
+
+    # Make `need` bytes available from self.start; False on EOF
+    def fill(self, need):
+        if self.start + need > len(self.buf):
+            pending = self.end - self.start
+            if need > len(self.buf):
+                grown = bytearray(max(need, 2 * len(self.buf)))
+                grown[:pending] = self.buf[self.start:self.end]
+                self.buf = grown
+            else:
+                self.buf[:pending] = self.buf[self.start:self.end]
+            self.start, self.end = 0, pending
+        view = memoryview(self.buf)
+        while self.end - self.start < need:
+            n = self.sock.recv_into(view[self.end:])
+            if n == 0:
+                return False
+            self.end += n
+        return True
+
+    # (type, payload), or None if the peer closed the connection between frames
+    def read(self):
+        if not self.fill(header.size):
+            if self.end == self.start:
+                return None
+            raise ConnectionError("Connection closed inside a frame header")
+        kind, size = header.unpack_from(self.buf, self.start)
+        check_size(kind, size)
+        if not self.fill(header.size + size):
+            raise ConnectionError(f"Connection closed inside a {frame_names[kind]} frame")
+        begin = self.start + header.size
+        self.start = begin + size
+        return kind, bytes(memoryview(self.buf)[begin:self.start])
+
+    def expect(self, kind):
+        frame = self.read()
+        if frame is None:
+            raise ConnectionError(f"Connection closed before the {frame_names[kind]} frame")
+        if frame[0] != kind:
+            raise ValueError(f"Expected a {frame_names[kind]} frame, got {frame_names[frame[0]]}")
+        return frame[1]
+
+    # DATA payloads one at a time up to the next END
+    def stream_chunks(self):
+        while True:
+            frame = self.read()
+            if frame is None:
+                raise ConnectionError("Connection closed before the end of the stream")
+            if frame[0] == END:
+                return
+            if frame[0] != DATA:
+                raise ValueError(f"Expected a data or end frame, got {frame_names[frame[0]]}")
+            yield frame[1]
+
+    # DATA payloads up to the next END, joined; None on a clean close
+    def read_stream(self):
+        frame = self.read()
+        if frame is None:
+            return None
+        packet = bytearray()
+        while frame[0] == DATA:
+            packet += frame[1]
+            frame = self.read()
+            if frame is None:
+                raise ConnectionError("Connection closed before the end of the stream")
+        if frame[0] != END:
+            raise ValueError(f"Expected a data or end frame, got {frame_names[frame[0]]}")
+        return bytes(packet)
+
+# The same frames over asyncio streams, for 2005089_receiver_server
+async def read_frame_async(reader):
+    try:
+        head = await reader.readexactly(header.size)
+    except asyncio.IncompleteReadError as e:
+        if not e.partial:
+            return None
+        raise ConnectionError("Connection closed inside a frame header") from None
+    kind, size = header.unpack(head)
+    check_size(kind, size)
+    try:
+        return kind, await reader.readexactly(size)
+    except asyncio.IncompleteReadError:
+        raise ConnectionError(f"Connection closed inside a {frame_names[kind]} frame") from None
+
+async def expect_async(reader, kind):
+    frame = await read_frame_async(reader)
+    if frame is None:
+        raise ConnectionError(f"Connection closed before the {frame_names[kind]} frame")
+    if frame[0] != kind:
+        raise ValueError(f"Expected a {frame_names[kind]} frame, got {frame_names[frame[0]]}")
+    return frame[1]
+
+async def write_frame_async(writer, kind, payload=b""):
+    writer.write(header.pack(kind, len(payload)))
+    writer.write(payload)
+    await writer.drain()
+
+def self_check():
+    import os
+    import socket
+    import threading
+    left, right = socket.socketpair()
+    data = os.urandom(5 * chunk_size + 123)
+    def send():
+        send_frame(left, HANDSHAKE, b"offer")
+        send_stream(left, data)
+        send_stream(left, b"")
+        send_stream(left, b"x" * 70000, size=1000)
+        send_chunks(left, [b"ab", b"", b"cd"])
+        left.close()
+    sender = threading.Thread(target=send)
+    sender.start()
+    # A small buffer forces compaction and growth
+    reader = FrameReader(right, size=4096)
+    ok = (reader.expect(HANDSHAKE) == b"offer" and reader.read_stream() == data
+          and reader.read_stream() == b"" and reader.read_stream() == b"x" * 70000
+          and list(reader.stream_chunks()) == [b"ab", b"cd"] and reader.read_stream() is None)
+    sender.join()
+    right.close()
+    # An oversized handshake frame is refused from its header alone
+    left, right = socket.socketpair()
+    left.sendall(header.pack(HANDSHAKE, max_message + 1))
+    try:
+        FrameReader(right).read()
+        ok = False
+    except ValueError:
+        pass
+    left.close()
+    right.close()
+    return ok
+
+if __name__ == "__main__":
+    print("Frames survive the socket intact:", self_check())
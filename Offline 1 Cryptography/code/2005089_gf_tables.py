@@ -0,0 +1,59 @@
+import importlib
+from BitVector import BitVector # type: ignore
+bvd = importlib.import_module('2005089_bitvector-demo')
+modulus = BitVector(bitstring='100011011')  # x^8 + x^4 + x^3 + x + 1
+
+# Multiply by x (i.e. by 0x02) modulo the AES polynomial
+def xtime(b):
+    b <<= 1
+    if b & 0x100:
+        b ^= 0x11B
+    return b
+
+# Shift-and-add multiplication, only used to fill the tables
+def gf_mul(a, b):
+    result = 0
+    while b:
+        if b & 1:
+            result ^= a
+        a = xtime(a)
+        b >>= 1
+    return result
+
+def build_table(c):
+    return tuple(gf_mul(x, c) for x in range(256))
+
+# Every constant that appears in the Mixer / InvMixer matrices
+constants = sorted({cell.intValue() for matrix in (bvd.Mixer, bvd.InvMixer) for row in matrix for cell in row})
+
+# MUL[c][x] = c . x in GF(2^8)
+MUL = {c: build_table(c) for c in constants}
+
+MixerInt = [[cell.intValue() for cell in row] for row in bvd.Mixer]
+InvMixerInt = [[cell.intValue() for cell in row] for row in bvd.InvMixer]
+
+# Product tables laid out like the matrices: MixerTables[k][j] = MUL[Mixer[k][j]]
+MixerTables = [[MUL[c] for c in row] for row in MixerInt]
+InvMixerTables = [[MUL[c] for c in row] for row in InvMixerInt]
+
+# state x mixer on a 4x4 matrix of ints (the same product mix_column computes)
+def mix_matrix(state, mixer):
+    tables = [[MUL[c] for c in row] for row in mixer]
+    return [
+        [tables[0][j][state[i][0]] ^ tables[1][j][state[i][1]] ^ tables[2][j][state[i][2]] ^ tables[3][j][state[i][3]] for j in range(4)]
+        for i in range(4)
+    ]
+
+# Compare every table entry with BitVector.gf_multiply_modular
+def self_check():
+    for c, table in MUL.items():
+        c_bv = BitVector(intVal=c, size=8)
+        for x in range(256):
+            expected = BitVector(intVal=x, size=8).gf_multiply_modular(c_bv, modulus, 8).intValue()
+            if table[x] != expected:
+                return False
+    return True
+
+if __name__ == "__main__":
+    print("Constants:", " ".join(f"{c:02x}" for c in constants))
+    print("Tables match gf_multiply_modular:", self_check())
@@ -0,0 +1,112 @@
+import importlib
+import struct
+import Crypto.Util.number # type: ignore
+
+ecdh = importlib.import_module('2005089_ecdh_defs')
+
+# Binary ECDH handshake, replacing the JSON arrays of decimal integers.
+# Field elements are fixed-width big-endian, n = field_size(P) bytes; points
+# are SEC1 compressed (1 + n bytes). Mode names are short ASCII strings.
+#
+#   offer (Alice -> Bob): n (2 bytes) || P || a || b || G || public_A
+#                         || mode count (1) || (len (1) || name) per mode
+#   reply (Bob -> Alice): public_B || len (1) || mode
+#
+# An empty mode list means the sender only speaks CBC. Both messages travel
+# as HANDSHAKE frames (2005089_frames).
+
+key_sizes = (128, 192, 256)  # field sizes accepted in an offer
+
+def encode_modes(modes):
+    out = bytes([len(modes)])
+    for mode in modes:
+        name = mode.encode('ascii')
+        out += bytes([len(name)]) + name
+    return out
+
+def decode_modes(data, offset):
+    modes = []
+    for _ in range(data[offset]):
+        size = data[offset + 1]
+        modes.append(data[offset + 2:offset + 2 + size].decode('ascii'))
+        offset += 1 + size
+    return modes, offset + 1
+
+def encode_offer(a, b, g, public, p, modes):
+    n = ecdh.field_size(p)
+    return (struct.pack(">H", n) + p.to_bytes(n, 'big') + (a % p).to_bytes(n, 'big') + (b % p).to_bytes(n, 'big')
+            + ecdh.encode_point(g, p) + ecdh.encode_point(public, p) + encode_modes(modes))
+
+# (a, b, G, public_A, P, modes); both points are checked to be on the curve.
+# The curve comes from the peer, so its size, P and discriminant are checked
+# before any square root is taken.
+def decode_offer(data):
+    try:
+        n = struct.unpack_from(">H", data)[0]
+        if n * 8 not in key_sizes:
+            raise ValueError(f"Unsupported field size of {n} bytes in handshake offer")
+        p, a, b = (int.from_bytes(data[2 + i * n:2 + (i + 1) * n], 'big') for i in range(3))
+        if ecdh.field_size(p) != n or not Crypto.Util.number.isPrime(p):
+            raise ValueError("Handshake offer modulus is not a prime of the stated size")
+        if (4 * a**3 + 27 * b**2) % p == 0:
+            raise ValueError("Handshake offer curve is singular")
+        offset = 2 + 3 * n
+        g = ecdh.decode_point(data[offset:offset + n + 1], a, b, p)
+        public = ecdh.decode_point(data[offset + n + 1:offset + 2 * n + 2], a, b, p)
+        modes, end = decode_modes(data, offset + 2 * n + 2)
+    except (IndexError, struct.error, UnicodeDecodeError) as e:
+        raise ValueError(f"Malformed handshake offer: {e}") from None
+    if end != len(data):
+        raise ValueError("Malformed handshake offer")
+    return a, b, g, public, p, modes
+
+def encode_reply(public, mode, p):
+    return ecdh.encode_point(public, p) + encode_modes([mode])[1:]
+
+# (public_B, mode), decompressed on the curve Alice offered
+def decode_reply(data, a, b, p):
+    n = ecdh.field_size(p)
+    try:
+        public = ecdh.decode_point(data[:n + 1], a, b, p)
+        size = data[n + 1]
+        mode = data[n + 2:n + 2 + size].decode('ascii')
+    except (IndexError, UnicodeDecodeError) as e:
+        raise ValueError(f"Malformed handshake reply: {e}") from None
+    if n + 2 + size != len(data):
+        raise ValueError("Malformed handshake reply")
+    return public, mode
+
+def self_check():
+    import json
+    curve_pool = importlib.import_module('2005089_curve_pool')
+    for bits, (a, b, g, p) in curve_pool.standard_curves.items():
+        k = 0x1234567 << (bits - 32)
+        public = ecdh.scalar_mult(k, g, a, p)
+        offer = encode_offer(a, b, g, public, p, ["gcm", "cbc"])
+        if decode_offer(offer) != (a, b, g, public, p, ["gcm", "cbc"]):
+            return False
+        if decode_reply(encode_reply(public, "gcm", p), a, b, p) != (public, "gcm"):
+            return False
+        # roughly half the JSON size
+        if len(offer) * 2 > len(json.dumps((a, b, g, public, p, ["gcm", "cbc"]))) + 16:
+            return False
+    # Composite moduli, singular curves and odd sizes are refused up front
+    for n, p, a, b in ((2, 561, 0, 1), (2, 65521, 0, 0), (0, 0, 0, 0), (40, (1 << 319) + 1, 0, 1)):
+        g = b"\x02" + bytes(n)
+        forged = struct.pack(">H", n) + b"".join(v.to_bytes(n, 'big') for v in (p, a, b)) + g + g + encode_modes(["gcm"])
+        try:
+            decode_offer(forged)
+            return False
+        except ValueError:
+            pass
+    # A point that is not on the curve is refused
+    bad = bytearray(offer)
+    bad[-16] ^= 1
+    try:
+        decode_offer(bytes(bad))
+        return False
+    except ValueError:
+        return True
+
+if __name__ == "__main__":
+    print("Binary handshake round-trips on the standard curves:", self_check())
@@ -0,0 +1,126 @@
+# Modular arithmetic for the ECDH code, all iterative. Inversion goes through
+# the built-in pow(a, -1, m) (extended Euclid in C); batch_inverse uses
+# Montgomery's trick so that N inversions cost one inversion and 3(N - 1)
+# multiplications.
+
+def gcd(a, b):
+    while b:
+        a, b = b, a % b
+    return abs(a)
+
+# (g, x, y) with a*x + b*y = g
+def egcd(a, b):
+    x0, x1, y0, y1 = 1, 0, 0, 1
+    while b:
+        q = a // b
+        a, b = b, a - q * b
+        x0, x1 = x1, x0 - q * x1
+        y0, y1 = y1, y0 - q * y1
+    return a, x0, y0
+
+# Right-to-left square and multiply
+def mod_pow(base, exponent, modulus):
+    result = 1 % modulus
+    base %= modulus
+    while exponent:
+        if exponent & 1:
+            result = result * base % modulus
+        base = base * base % modulus
+        exponent >>= 1
+    return result
+
+def mod_inverse(a, modulus):
+    try:
+        return pow(a, -1, modulus)
+    except ValueError:
+        raise ValueError(f"No modular inverse for {a} mod {modulus}") from None
+
+# Same result as mod_inverse, in Python; kept as the readable version
+def mod_inverse_euclid(a, modulus):
+    g, x, _ = egcd(a % modulus, modulus)
+    if g != 1:
+        raise ValueError(f"No modular inverse for {a} mod {modulus}")
+    return x % modulus
+
+# r with r^2 = a mod p for an odd prime p. p = 3 mod 4 (P-192, P-256,
+# secp128r1) is a single exponentiation; other primes go through
+# Tonelli-Shanks. p may come from a peer, so both loops are bounded and a
+# composite p raises ValueError instead of looping forever.
+def mod_sqrt(a, p, max_z=1 << 12):
+    a %= p
+    if a == 0:
+        return 0
+    if pow(a, (p - 1) // 2, p) != 1:
+        raise ValueError(f"{a} is not a square mod {p}")
+    if p % 4 == 3:
+        return pow(a, (p + 1) // 4, p)
+    q, s = p - 1, 0
+    while q % 2 == 0:
+        q //= 2
+        s += 1
+    z = 2
+    while pow(z, (p - 1) // 2, p) != p - 1:
+        z += 1
+        if z > max_z or z >= p:
+            raise ValueError(f"No quadratic non-residue found mod {p}; not a prime")
+    m, c, t, r = s, pow(z, q, p), pow(a, q, p), pow(a, (q + 1) // 2, p)
+    while t != 1:
+        # least i with t^(2^i) = 1
+        i, t2 = 0, t
+        while t2 != 1:
+            t2 = t2 * t2 % p
+            i += 1
+            if i == m:
+                raise ValueError(f"Square root of {a} mod {p} did not converge; not a prime")
+        b = pow(c, 1 << (m - i - 1), p)
+        m, c, t, r = i, b * b % p, t * b * b % p, r * b % p
+    return r
+
+# Inverses of every value at once; all values must be invertible
+def batch_inverse(values, modulus):
+    if not values:
+        return []
+    prefix = []
+    acc = 1
+    for v in values:
+        acc = acc * v % modulus
+        prefix.append(acc)
+    inv = mod_inverse(acc, modulus)
+    out = [0] * len(values)
+    for i in range(len(values) - 1, 0, -1):
+        out[i] = inv * prefix[i - 1] % modulus
+        inv = inv * values[i] % modulus
+    out[0] = inv
+    return out
+
+def self_check(trials=200):
+    import random
+    p = (1 << 127) - 1
+    values = [random.randrange(1, p) for _ in range(trials)]
+    for v in values[:20]:
+        if mod_inverse_euclid(v, p) != mod_inverse(v, p) or mod_pow(v, p - 2, p) != mod_inverse(v, p):
+            return False
+        if gcd(v * 6, 9) != 3 * gcd(v * 2, 3):
+            return False
+    if batch_inverse(values, p) != [mod_inverse(v, p) for v in values]:
+        return False
+    # p = 3 mod 4, and primes with 2^4 | p - 1 for Tonelli-Shanks
+    for q in (p, 2**64 - 59, 65537, 998244353):
+        for v in values[:20]:
+            if mod_sqrt(v * v, q) not in (v % q, -v % q):
+                return False
+    # composite moduli are refused rather than hanging
+    for a, q in ((1, 561), (4, 1105), (2, 9)):
+        try:
+            mod_sqrt(a, q)
+            return False
+        except ValueError:
+            pass
+    try:
+        mod_inverse(6, 9)
+        return False
+    except ValueError:
+        return True
+
+if __name__ == "__main__":
+    print("Iterative, batch inversion and square roots check out:", self_check())
@@ -1,116 +1,177 @@
 import socket
-import json
-import math
+import os
 import Crypto.Util.number
 import importlib
 from BitVector import *
 
 aes = importlib.import_module("2005089_aes_defs")
+parallel = importlib.import_module("2005089_aes_parallel")
+stream = importlib.import_module("2005089_aes_stream")
 ecdh = importlib.import_module("2005089_ecdh_defs")
+handshake = importlib.import_module("2005089_handshake")
+frames = importlib.import_module("2005089_frames")
+session = importlib.import_module("2005089_session")
 
 PORT = 12345
 file_input = True
+use_ttable = True  # False runs the BitVector reference rounds
+engine = parallel.default_engine if use_ttable else "reference"
+workers = parallel.default_workers  # CBC decryption is split across processes
+modes = ["gcm", "cbc"]  # accepted from the sender's offer
+pipelined = True  # decrypt and write each chunk while the next one is received
+max_in_flight = 4  # received chunks waiting for decryption, frames.chunk_size each
+# "affine" in either runs the reference point arithmetic
+ecc_base_method = ecdh.fixed_base_method  # public key k.G, comb table cached per curve
+ecc_shared_method = ecdh.shared_method  # x-only ladder, same cost for every key bit
 # file_path = "image-min.jpg"
 priv_key_B = Crypto.Util.number.getRandomNBitInteger(128)
+# Tickets let a later connection skip ECDH; the key file
+# (2005089_ticket_key.bin) keeps them valid across runs of this
+# one-connection receiver
+resume_sessions = True  # False issues no tickets and refuses every resume
+
+# Frames are read on a producer thread and each chunk is decrypted and
+# written as it lands. GCM plaintext is unauthenticated until the tag is
+# checked at the end, so chunks go to a temporary file that only replaces
+# output_path once the whole packet checks out, and is deleted otherwise.
+def receive_file_pipelined(reader, cipher, mode, output_path):
+    print(f"Receiving and decrypting {output_path} in chunks ...")
+    dec = stream.PacketDecryptor(cipher, mode, b"data")
+    tmp_path = f"{output_path}.{os.getpid()}.part"
+    try:
+        with open(tmp_path, "wb") as f:
+            for chunk in stream.pipelined(reader.stream_chunks(), max_in_flight):
+                f.write(dec.update(chunk))
+            f.write(dec.finalize())
+        os.replace(tmp_path, output_path)
+    except (ValueError, ConnectionError) as e:
+        os.remove(tmp_path)
+        print("\n!! Rejected packet:" if isinstance(e, ValueError) else "\n!! Connection lost:", e)
+        return False
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    print(f"\n## Decrypted file written to: {output_path}")
+    return True
+
+# Full ECDH exchange on Alice's offer; returns (AES key, mode) after sending
+# the reply and a session ticket (an empty one when issuer is None)
+def full_handshake(client, offer, issuer):
+    # Both points arrive compressed and are decompressed onto the offered curve
+    a, b, G, public_key_A, P, offered = handshake.decode_offer(offer)
+    offered = offered or ["cbc"]  # an empty offer means CBC only
+    mode = next((m for m in offered if m in modes), None)
+    if mode is None:
+        raise ValueError(f"No common cipher mode: offered {offered}, accepted {modes}")
+    public_key_B = ecdh.scalar_mult(priv_key_B, G, a, P, ecc_base_method)
+    frames.send_frame(client, frames.HANDSHAKE, handshake.encode_reply(public_key_B, mode, P))
+
+    shared_key = ecdh.shared_x(priv_key_B, public_key_A, a, P, ecc_shared_method)
+    key = aes.shared_key_bytes(shared_key)
+    frames.send_frame(client, frames.TICKET, issuer.issue(key, mode) if issuer else b"")
+    return key, mode
+
+# A RESUME with a valid ticket skips ECDH; a refused one is followed by a
+# full offer on the same connection
+def establish_session(client, reader, issuer):
+    frame = reader.read()
+    if frame is None:
+        raise ConnectionError("Connection closed before the handshake")
+    kind, payload = frame
+    if kind == frames.RESUME:
+        reply, key, mode = issuer.accept(payload, modes) if issuer else (b"", None, None)
+        frames.send_frame(client, frames.RESUME, reply)
+        if key is not None:
+            return key, mode, True
+        payload = reader.expect(frames.HANDSHAKE)
+    elif kind != frames.HANDSHAKE:
+        raise ValueError(f"Expected a handshake or resume frame, got {frames.frame_names[kind]}")
+    return full_handshake(client, payload, issuer) + (False,)
+
+# Whole-packet path: read every DATA frame, then decrypt in one go
+def receive_file(reader, cipher, mode, output_path):
+    try:
+        packet = reader.read_stream()
+    except ConnectionError as e:
+        print("\n!! Connection lost:", e)
+        return False
+    if packet is None:
+        print("\n!! Connection lost: closed before the file data")
+        return False
+    print("Decrypting ... ")
+    # CBC: all blocks are decrypted as one batch, then XORed with the
+    # shifted ciphertext. GCM: CTR keystream plus GHASH, checked at the end.
+    try:
+        unpadded_bytes = stream.decrypt_packet(cipher, mode, packet, b"data")
+    except ValueError as e:
+        print("\n!! Rejected packet:", e)
+        return False
+    with open(output_path, "wb") as f:
+        f.write(unpadded_bytes)
+    print(f"\n## Decrypted file written to: {output_path}")
+    return True
 
 def start_bob():
     server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     server.bind(("localhost", PORT))
     server.listen(1)
     
+    issuer = session.TicketIssuer.from_file() if resume_sessions else None
     client, _ = server.accept()
+    try:
+        serve_client(client, issuer)
+    finally:
+        client.close()
+        server.close()
 
-    # === ECC Key Exchange ===
-    received = json.loads(client.recv(2048).decode())
-    a, b, G, public_key_A, P = received
-    public_key_B = ecdh.ecc_scalar_mult(priv_key_B, G, a, P)
-    client.sendall(json.dumps(public_key_B).encode())
+def serve_client(client, issuer=None):
+    reader = frames.FrameReader(client)
 
-    shared_point = ecdh.ecc_scalar_mult(priv_key_B, tuple(public_key_A), a, P)
-    shared_key = shared_point[0]
+    # === ECC Key Exchange, or a resumed session ===
+    key, mode, resumed = establish_session(client, reader, issuer)
+    print("Mode:", mode.upper(), "(resumed session)" if resumed else "(full ECDH handshake)")
 
     # Prepare AES key
-    aes_key_bits = bin(shared_key)[2:].zfill(128)[:128]
-    round_keys = [BitVector(bitstring=aes_key_bits)]
-    rcons = aes.generate_r_constant()
-    for i in range(10):
-        round_keys.append(aes.generate_r_key(round_keys[-1], rcons[i]))
-
-    # === RECEIVE and DECRYPT FILENAME ===
-    name_packet = client.recv(2048).decode()
-    bv_packet = BitVector(textstring=name_packet)
-    iv = bv_packet[:128]
-    cipher_name = bv_packet[128:]
-
-    decrypted_bv = BitVector(size=0)
-    for i in range(0, len(cipher_name), 128):
-        block = cipher_name[i:i+128]
-        state = aes.create_matrix(block)
-        state = aes.xor_round_key(state, aes.create_matrix(round_keys[10]))
-        for rnd in reversed(range(10)):
-            state = aes.decrypte(state, aes.create_matrix(round_keys[rnd]), rnd)
-        out_block = aes.create_bitvector(state) ^ iv
-        decrypted_bv += out_block
-        iv = block
-
-    name_bytes = bytes([int(decrypted_bv[i:i+8]) for i in range(0, len(decrypted_bv), 8)])
-    pad = name_bytes[-1]
-    file_path = name_bytes[:-pad].decode()
-
-    client.sendall(b"ACK")  # ACK back to Alice
-
-    client.recv(1024)  # ALICE ready
-    client.sendall(b"BOB ready to receive")
+    cipher = aes.AES(key, engine, workers)
+    if workers > 1:
+        parallel.get_pool(workers)  # fork the decryption workers before the reader thread starts
 
     # print("Shared Secret Key:", shared_key)
+    if file_input:
+        # filename, data packet, filename, data packet, ... until Alice closes
+        while True:
+            frame = reader.read()
+            if frame is None:
+                break
+            if frame[0] != frames.FILENAME:
+                raise ValueError(f"Expected a filename frame, got {frames.frame_names[frame[0]]}")
+            file_path = stream.decrypt_packet(cipher, mode, frame[1], b"filename").decode()
+            output_path = "output_" + os.path.basename(file_path)
+            receive = receive_file_pipelined if pipelined else receive_file
+            if not receive(reader, cipher, mode, output_path):
+                break
+        return
+
+    # === RECEIVE and DECRYPT FILENAME ===
+    name_packet = reader.expect(frames.FILENAME)
+    stream.decrypt_packet(cipher, mode, name_packet, b"filename")
     while True:
-        data = client.recv(8192 * 16).decode()
-        if file_input:
-            print("Decrypting ... ")
-        else: 
-            print("Received data: ", end="") 
-            aes.print_inf(BitVector(textstring=data), hex_first=False)
-        iv_text = data[:16]
-        iv = BitVector(textstring=iv_text)
-        ciphertext_text = data[16:]
-
-        aes_key_bits = bin(shared_key)[2:].zfill(128)[:128]
-        round_keys = [BitVector(bitstring=aes_key_bits)]
-        rcons = aes.generate_r_constant()
-        for i in range(10):
-            round_keys.append(aes.generate_r_key(round_keys[-1], rcons[i]))
-
-        decrypted_bv = BitVector(size=0)
-        chunks = math.ceil(len(ciphertext_text) / 16)
-        for i in range(chunks):
-            block = ciphertext_text[i*16:(i+1)*16]
-            block_bv = BitVector(textstring=block)
-            matrix = aes.create_matrix(block_bv)
-            matrix = aes.xor_round_key(matrix, aes.create_matrix(round_keys[10]))
-
-            for rnd in reversed(range(10)):
-                matrix = aes.decrypte(matrix, aes.create_matrix(round_keys[rnd]), rnd)
-
-            plain_block = aes.create_bitvector(matrix) ^ iv
-            decrypted_bv += plain_block
-            iv = block_bv
-
-        decrypted_bytes = bytes([int(decrypted_bv[i:i+8]) for i in range(0, len(decrypted_bv), 8)])
-        pad_value = decrypted_bytes[-1]
-        unpadded_bytes = decrypted_bytes[:-pad_value]
-
-        if file_input:
-            output_path = "output_" + file_path
-            with open(output_path, "wb") as f:
-                f.write(unpadded_bytes)
-            print(f"\n## Decrypted file written to: {output_path}")
-            break;
-        else:
-            print("\nDecrypted Text:")
-            aes.print_inf(BitVector(rawbytes=unpadded_bytes), hex_first=False)
-
-    client.close()
-    server.close()
+        # One packet: DATA frames up to END, whatever its size
+        packet = reader.read_stream()
+        if packet is None:
+            break  # Alice closed the connection
+        print("Received data: ", end="") 
+        aes.print_inf(BitVector(rawbytes=packet), hex_first=True)
+
+        try:
+            unpadded_bytes = stream.decrypt_packet(cipher, mode, packet, b"data")
+        except ValueError as e:
+            print("\n!! Rejected packet:", e)
+            break
+
+        print("\nDecrypted Text:")
+        aes.print_inf(BitVector(rawbytes=unpadded_bytes), hex_first=False)
 
 if __name__ == "__main__":
     start_bob()
\ No newline at end of file
@@ -0,0 +1,322 @@
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import functools
+import hmac
+import importlib
+import itertools
+import os
+import time
+import Crypto.Util.number # type: ignore
+
+aes = importlib.import_module("2005089_aes_defs")
+ttable = importlib.import_module("2005089_aes_ttable")
+parallel = importlib.import_module("2005089_aes_parallel")
+stream = importlib.import_module("2005089_aes_stream")
+gcm = importlib.import_module("2005089_aes_gcm")
+ecdh = importlib.import_module("2005089_ecdh_defs")
+handshake = importlib.import_module("2005089_handshake")
+frames = importlib.import_module("2005089_frames")
+session = importlib.import_module("2005089_session")
+
+# Long-running receiver for many concurrent senders (2005089_sender.py talks
+# to it unchanged). Each connection runs its own ECDH handshake, or resumes a
+# session from a ticket this server issued, and may send any number of
+# filename + data packets before closing. The event loop only
+# moves frames; the handshake and every decryption job run in a process pool:
+#   CBC - each job gets the previous ciphertext block as its IV
+#   CTR - each job gets its starting counter
+#   GCM - each job returns its plaintext and the GHASH of its ciphertext from
+#         zero; the loop folds them in order as y . H^m ^ partial (m = blocks
+#         in the job) and checks the tag at the end
+# Results are written in order to a temporary file that only replaces the
+# output once the packet has been fully decrypted (and authenticated).
+#
+#   python 2005089_receiver_server.py --max-connections 32 --workers 4
+#   python 2005089_receiver_server.py --ticket-key 2005089_ticket_key.bin  # tickets survive restarts
+
+HOST = "localhost"
+PORT = 12345
+engine = parallel.default_engine
+modes = ["gcm", "cbc", "ctr"]  # accepted from the sender's offer
+max_connections = 16  # served at once; later connections wait to be admitted
+max_in_flight = 4  # decryption jobs per connection before its socket is left unread
+job_size = 1 << 20  # ciphertext bytes per decryption job (a multiple of 16)
+pool_workers = os.cpu_count() or 1
+output_dir = "."
+
+# ---- process pool jobs ----
+
+# (reply, AES key, mode) for one offer, with a fresh private key
+def handshake_job(offer, accepted):
+    a, b, G, public_key_A, P, offered = handshake.decode_offer(offer)
+    offered = offered or ["cbc"]  # an empty offer means CBC only
+    mode = next((m for m in offered if m in accepted), None)
+    if mode is None:
+        raise ValueError(f"No common cipher mode: offered {offered}, accepted {accepted}")
+    priv_key_B = Crypto.Util.number.getRandomNBitInteger(max(P.bit_length(), 128))
+    public_key_B = ecdh.scalar_mult(priv_key_B, G, a, P, ecdh.fixed_base_method)
+    shared_key = ecdh.shared_x(priv_key_B, public_key_A, a, P, ecdh.shared_method)
+    return handshake.encode_reply(public_key_B, mode, P), aes.shared_key_bytes(shared_key), mode
+
+def packet_job(key, engine, mode, packet, aad):
+    return stream.decrypt_packet(aes.AES(key, engine), mode, packet, aad)
+
+# (plaintext, GHASH of the ciphertext from zero or None) for one piece
+def decrypt_job(key, engine, mode, data, position):
+    if mode == "cbc":
+        return parallel.cbc_decrypt(data, key, position, engine, 1), None
+    n_blocks = (len(data) + 15) // 16
+    if mode == "ctr":
+        return parallel.ctr_xor(data, key, position, engine, 1), None
+    cipher = aes.AES(key, engine)
+    g = gcm.GHASH(int.from_bytes(cipher.encrypt_block(bytes(16)), 'big'))
+    g.update(data)
+    keystream = gcm.gctr_keystream(cipher, position, n_blocks)
+    return parallel.xor_bytes(data, keystream[:len(data)]), g.pad()
+
+# ---- GCM bookkeeping in the loop (a few field multiplications per job) ----
+
+@functools.lru_cache(maxsize=64)
+def h_power(h, m):
+    result, base = 1 << 127, h  # 1 << 127 is the field element 1
+    while m:
+        if m & 1:
+            result = gcm.gf_mult(result, base)
+        base = gcm.gf_mult(base, base)
+        m >>= 1
+    return result
+
+def ghash_blocks(h, data, y=0):
+    data += bytes(-len(data) % 16)
+    for i in range(0, len(data), 16):
+        y = gcm.gf_mult(y ^ int.from_bytes(data[i:i + 16], 'big'), h)
+    return y
+
+# One data packet (IV || ciphertext || tag) arriving in frames, cut into
+# jobs. hold is what must stay buffered until END: the tag for GCM, the last
+# block for CBC so the padding is checked on it.
+class PacketJobs:
+    def __init__(self, key, mode, aad):
+        self.key = key
+        self.mode = mode
+        self.aad = aad
+        self.hold = 16 if mode in ("gcm", "cbc") else 0
+        self.pending = bytearray()
+        self.position = None  # CBC: previous ciphertext block; CTR / GCM: counter
+        self.data_len = 0
+
+    def start(self, iv):
+        if self.mode == "cbc" or self.mode == "ctr":
+            self.position = iv
+            return
+        round_keys = ttable.expand_key(self.key)
+        self.h = int.from_bytes(ttable.encrypt_block(bytes(16), round_keys), 'big')
+        j0 = gcm.initial_counter(iv.to_bytes(gcm.nonce_size, 'big'), self.h)
+        self.tag_mask = int.from_bytes(ttable.encrypt_block(j0.to_bytes(16, 'big'), round_keys), 'big')
+        self.position = gcm.inc32(j0)
+        self.y = ghash_blocks(self.h, self.aad)
+
+    # Jobs (data, position) that can be cut from the buffered bytes
+    def feed(self, chunk, final=False):
+        self.pending += chunk
+        if self.position is None:
+            size = stream.iv_size(self.mode)
+            if len(self.pending) < size:
+                if final:
+                    raise ValueError("Packet is shorter than its IV")
+                return []
+            self.start(int.from_bytes(self.pending[:size], 'big'))
+            del self.pending[:size]
+        jobs = []
+        while len(self.pending) - self.hold >= job_size:
+            jobs.append(self.cut(job_size))
+        if final:
+            if self.mode == "gcm":
+                if len(self.pending) < 16:
+                    raise ValueError("GCM data is shorter than the tag")
+                self.tag = bytes(self.pending[-16:])
+                del self.pending[-16:]
+            if self.mode == "cbc" and (not self.pending or len(self.pending) % 16):
+                raise ValueError("Ciphertext length is not a multiple of 16 bytes")
+            jobs.append(self.cut(len(self.pending)))
+        return jobs
+
+    def cut(self, size):
+        data = bytes(self.pending[:size])
+        del self.pending[:size]
+        position = self.position
+        n_blocks = (size + 15) // 16
+        if self.mode == "cbc":
+            self.position = int.from_bytes(data[-16:], 'big') if data else position
+        elif self.mode == "ctr":
+            self.position = (position + n_blocks) % (1 << 128)
+        else:
+            self.position = gcm.inc32(position, n_blocks)
+        self.data_len += size
+        return data, position
+
+    # Fold one job's GHASH into the running value (jobs arrive in order)
+    def absorb(self, size, partial):
+        if partial is not None:
+            self.y = gcm.gf_mult(self.y, h_power(self.h, (size + 15) // 16)) ^ partial
+
+    def check_tag(self):
+        lengths = (len(self.aad) * 8).to_bytes(8, 'big') + (self.data_len * 8).to_bytes(8, 'big')
+        tag = (ghash_blocks(self.h, lengths, self.y) ^ self.tag_mask).to_bytes(16, 'big')
+        if not hmac.compare_digest(tag, self.tag):
+            raise ValueError("GCM authentication tag mismatch")
+
+class ConnectionStats:
+    def __init__(self, peer):
+        self.peer = peer
+        self.start = time.perf_counter()
+        self.handshake_ms = 0.0
+        self.resumed = False
+        self.bytes_in = 0
+        self.files = 0
+
+    def report(self):
+        elapsed = time.perf_counter() - self.start
+        rate = self.bytes_in / elapsed / 1e6 if elapsed else 0.0
+        print(f"[{self.peer}] closed: {self.files} file(s), {self.bytes_in} bytes in {elapsed:.3f} s "
+              f"({rate:.2f} MB/s), {'resumed' if self.resumed else 'handshake'} {self.handshake_ms:.2f} ms")
+
+class ReceiverServer:
+    def __init__(self, pool, max_connections=max_connections, engine=engine, modes=modes, out_dir=output_dir,
+                 issuer=None):
+        self.pool = pool
+        self.issuer = issuer or session.TicketIssuer()
+        self.slots = asyncio.Semaphore(max_connections)
+        self.engine = engine
+        self.modes = list(modes)
+        self.out_dir = out_dir
+        self.active = 0
+        self.ids = itertools.count(1)
+
+    def run_job(self, func, *args):
+        return asyncio.get_running_loop().run_in_executor(self.pool, func, *args)
+
+    async def handle(self, reader, writer):
+        peer = "{}:{}".format(*writer.get_extra_info("peername")[:2])
+        async with self.slots:
+            self.active += 1
+            stats = ConnectionStats(peer)
+            try:
+                await self.session(reader, writer, stats)
+            except (ValueError, ConnectionError, asyncio.IncompleteReadError) as e:
+                print(f"[{peer}] !! {e}")
+            finally:
+                self.active -= 1
+                writer.close()
+                stats.report()
+
+    # (key, mode): a ticket is checked in the loop (one small AES-GCM open);
+    # a refused ticket or a plain offer goes through handshake_job
+    async def establish(self, reader, writer, stats):
+        frame = await frames.read_frame_async(reader)
+        if frame is None:
+            raise ConnectionError("Connection closed before the handshake")
+        kind, payload = frame
+        start = time.perf_counter()
+        if kind == frames.RESUME:
+            reply, key, mode = self.issuer.accept(payload, self.modes)
+            await frames.write_frame_async(writer, frames.RESUME, reply)
+            if key is not None:
+                stats.resumed = True
+                stats.handshake_ms = (time.perf_counter() - start) * 1000
+                return key, mode
+            payload = await frames.expect_async(reader, frames.HANDSHAKE)
+            start = time.perf_counter()
+        elif kind != frames.HANDSHAKE:
+            raise ValueError(f"Expected a handshake or resume frame, got {frames.frame_names[kind]}")
+        reply, key, mode = await self.run_job(handshake_job, payload, self.modes)
+        stats.handshake_ms = (time.perf_counter() - start) * 1000
+        await frames.write_frame_async(writer, frames.HANDSHAKE, reply)
+        await frames.write_frame_async(writer, frames.TICKET, self.issuer.issue(key, mode))
+        return key, mode
+
+    async def session(self, reader, writer, stats):
+        key, mode = await self.establish(reader, writer, stats)
+        kind = "resumed" if stats.resumed else "full handshake"
+        print(f"[{stats.peer}] mode {mode.upper()} ({kind}), {self.active} connection(s) active")
+        # filename, data packet, filename, data packet, ... until the sender closes
+        while True:
+            frame = await frames.read_frame_async(reader)
+            if frame is None:
+                return
+            if frame[0] != frames.FILENAME:
+                raise ValueError(f"Expected a filename frame, got {frames.frame_names[frame[0]]}")
+            stats.bytes_in += len(frame[1])
+            name = await self.run_job(packet_job, key, self.engine, mode, frame[1], b"filename")
+            await self.receive_file(reader, stats, key, mode, name.decode())
+
+    async def receive_file(self, reader, stats, key, mode, name):
+        # the name comes from the peer: never leave output_dir
+        output_path = os.path.join(self.out_dir, "output_" + os.path.basename(name))
+        tmp_path = f"{output_path}.{os.getpid()}.{next(self.ids)}.part"
+        jobs = PacketJobs(key, mode, b"data")
+        in_flight = collections.deque()
+        try:
+            with open(tmp_path, "wb") as f:
+                # write finished jobs in order until at most `limit` are left
+                async def drain(limit, final):
+                    while len(in_flight) > limit:
+                        size, future = in_flight.popleft()
+                        plaintext, partial = await future
+                        jobs.absorb(size, partial)
+                        if final and not in_flight and mode == "cbc":
+                            plaintext = stream.pkcs7_unpad(plaintext)
+                        f.write(plaintext)
+
+                final = False
+                while not final:
+                    frame = await frames.read_frame_async(reader)
+                    if frame is None:
+                        raise ConnectionError("Connection closed before the end of the stream")
+                    if frame[0] not in (frames.DATA, frames.END):
+                        raise ValueError(f"Expected a data or end frame, got {frames.frame_names[frame[0]]}")
+                    final = frame[0] == frames.END
+                    stats.bytes_in += len(frame[1])
+                    for data, position in jobs.feed(frame[1], final):
+                        in_flight.append((len(data), self.run_job(decrypt_job, key, self.engine, mode, data, position)))
+                    # backpressure: this socket is not read again until its jobs drain
+                    await drain(0 if final else max_in_flight, final)
+            if mode == "gcm":
+                jobs.check_tag()
+            os.replace(tmp_path, output_path)
+        except BaseException:
+            for _, future in in_flight:
+                future.cancel()
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        stats.files += 1
+        print(f"[{stats.peer}] ## {name}: {jobs.data_len} bytes decrypted to {output_path}")
+
+async def serve(host=HOST, port=PORT, connections=max_connections, workers=pool_workers, ticket_key=None):
+    # without a key file, tickets are only good until the server stops
+    issuer = session.TicketIssuer.from_file(ticket_key) if ticket_key else session.TicketIssuer()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        server = ReceiverServer(pool, connections, issuer=issuer)
+        listener = await asyncio.start_server(server.handle, host, port, limit=2 * frames.chunk_size)
+        print(f"Receiver listening on {host}:{port} ({connections} connections, {workers} workers, {engine})")
+        async with listener:
+            await listener.serve_forever()
+
+def main():
+    parser = argparse.ArgumentParser(description="asyncio receiver for many concurrent senders")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--max-connections", type=int, default=max_connections)
+    parser.add_argument("--workers", type=int, default=pool_workers, help="process pool size")
+    parser.add_argument("--ticket-key", help="file keeping the session ticket key across restarts")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.max_connections, args.workers, args.ticket_key))
+    except KeyboardInterrupt:
+        print("\nReceiver stopped")
+
+if __name__ == "__main__":
+    main()
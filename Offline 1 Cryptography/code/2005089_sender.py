@@ -1,76 +1,116 @@
 import socket
-import json
-import math
 import Crypto.Util.number #type: ignore
 import importlib
 import os
+import sys
+import time
 from BitVector import *
 
 aes = importlib.import_module("2005089_aes_defs")
+parallel = importlib.import_module("2005089_aes_parallel")
+stream = importlib.import_module("2005089_aes_stream")
 ecdh = importlib.import_module('2005089_ecdh_defs')
+curve_pool = importlib.import_module('2005089_curve_pool')
+handshake = importlib.import_module('2005089_handshake')
+frames = importlib.import_module('2005089_frames')
+session = importlib.import_module('2005089_session')
 
 PORT = 12345
 file_input = True
 file_path = "2005089_image-min.jpg"
-
-# ECC Setup
-a, b, G, P = ecdh.generate_curve_params(128)
+file_paths = [file_path]  # sent one after another over one connection and key
+use_ttable = True  # False runs the BitVector reference rounds
+engine = parallel.default_engine if use_ttable else "reference"
+modes = ["gcm", "cbc"]  # offered to the receiver, most preferred first
+pipelined = True  # encrypt chunk N + 1 on a thread while chunk N is on the socket
+max_in_flight = 4  # encrypted chunks waiting for the socket, frames.chunk_size each
+# "affine" in either runs the reference point arithmetic
+ecc_base_method = ecdh.fixed_base_method  # public key k.G, comb table cached per curve
+ecc_shared_method = ecdh.shared_method  # x-only ladder, same cost for every key bit
+resume_sessions = True  # present a cached ticket instead of running ECDH again
+
+# ECC Setup: curves come ready-made from 2005089_curve_pool.json
+use_standard_curve = False  # True uses secp128r1 instead of a generated curve
+pool = curve_pool.CurvePool(128, standard=use_standard_curve)
 priv_key_A = Crypto.Util.number.getRandomNBitInteger(128)
 
-def start_alice():
+# The file is read and encrypted chunk by chunk on a producer thread and each
+# piece goes out as its own DATA frame; the packet is the same IV || ciphertext
+# (|| tag) as encrypt_packet, so the receiver may also read it whole
+def send_file_pipelined(s, cipher, mode, path):
+    print(f"Encrypting and sending {path} in chunks ...")
+    with open(path, "rb") as f:
+        chunks = iter(lambda: f.read(frames.chunk_size), b"")
+        pieces = stream.packet_chunks(cipher, mode, chunks, b"data")
+        frames.send_chunks(s, stream.pipelined(pieces, max_in_flight))
+    print("Encrypted file content and sent!")
+
+def send_filename(s, cipher, mode, path):
+    # Send IV + Encrypted filename as raw bytes
+    filename = os.path.basename(path).encode()
+    frames.send_frame(s, frames.FILENAME, stream.encrypt_packet(cipher, mode, filename, b"filename"))
+
+# Full ECDH exchange; returns (AES key, mode) and keeps the ticket Bob issues
+def full_handshake(s, reader, peer):
+    a, b, G, P = pool.get()
+    public_key_A = ecdh.scalar_mult(priv_key_A, G, a, P, ecc_base_method) 
+    # Binary offer: curve, compressed G and public key, accepted modes
+    frames.send_frame(s, frames.HANDSHAKE, handshake.encode_offer(a, b, G, public_key_A, P, modes))
+
+    # Bob answers with his public key and the mode he picked from ours
+    public_key_B, mode = handshake.decode_reply(reader.expect(frames.HANDSHAKE), a, b, P)
+    shared_key = ecdh.shared_x(priv_key_A, public_key_B, a, P, ecc_shared_method) 
+    key = aes.shared_key_bytes(shared_key)
+    ticket = reader.expect(frames.TICKET)
+    if resume_sessions:
+        session.save_ticket(peer, ticket, key, mode)
+    pool.fill()  # top the pool up in the background while the file is sent
+    return key, mode
+
+# Resume from a cached ticket if Bob still accepts it, else run ECDH
+def establish_session(s, reader, peer):
+    cached = session.load_ticket(peer) if resume_sessions else None
+    if cached is not None and cached[2] in modes:
+        ticket, secret, mode = cached
+        client_random, request = session.resume_request(ticket)
+        frames.send_frame(s, frames.RESUME, request)
+        server_random = reader.expect(frames.RESUME)
+        if server_random:
+            return session.connection_key(secret, client_random, server_random), mode, True
+        session.drop_ticket(peer)
+    return full_handshake(s, reader, peer) + (False,)
+
+def start_alice(paths=None):
     s = socket.socket(socket.AF_INET, socket.SOCK_STREAM) 
     s.connect(("localhost", PORT)) 
+    reader = frames.FrameReader(s, 1 << 12)
 
-    # ECC Key Exchange
-    public_key_A = ecdh.ecc_scalar_mult(priv_key_A, G, a, P) 
-    init_data = (a, b, G, public_key_A, P)
-    s.sendall(json.dumps(init_data).encode())
-
-    response = s.recv(2048).decode()
-    public_key_B = tuple(json.loads(response))
-    shared_point = ecdh.ecc_scalar_mult(priv_key_A, public_key_B, a, P)
-    shared_key = shared_point[0] 
-
-    # Prepare AES key
-    aes_key_bits = bin(shared_key)[2:].zfill(128)[:128]
-    round_keys = [BitVector(bitstring=aes_key_bits)]
-    rcons = aes.generate_r_constant()
-    for i in range(10):
-        round_keys.append(aes.generate_r_key(round_keys[-1], rcons[i]))
-
-    # === ENCRYPT FILENAME ===
-    filename = os.path.basename(file_path).encode()
-    pad_len = 16 - (len(filename) % 16)
-    filename += bytes([pad_len] * pad_len)
-
-    iv_name = BitVector(intVal=Crypto.Util.number.getRandomNBitInteger(128), size=128)
-    iv_reset_name = iv_name.deep_copy()
-
-    cipher_name = BitVector(size=0)
-    for i in range(0, len(filename), 16):
-        block = filename[i:i+16]
-        bv_block = BitVector(rawbytes=block) ^ iv_name
-        state = aes.create_matrix(bv_block)
-        state = aes.xor_round_key(state, aes.create_matrix(round_keys[0]))
-        for rnd in range(10):
-            state = aes.encrypte(state, aes.create_matrix(round_keys[rnd + 1]), rnd)
-        out_block = aes.create_bitvector(state)
-        cipher_name += out_block
-        iv_name = out_block
-
-    # Send IV + Encrypted filename
-    s.sendall((iv_reset_name + cipher_name).get_bitvector_in_ascii().encode())
-    s.recv(1024)  # ACK
-
-    s.sendall("ALICE ready to transmit".encode())
-    s.recv(1024)  # "BOB ready"
+    # ECC Key Exchange, or a resumed session, up to a ready AES key
+    start = time.perf_counter()
+    key, mode, resumed = establish_session(s, reader, f"localhost:{PORT}")
+    cipher = aes.AES(key, engine)
+    kind = "resumed session" if resumed else "full ECDH handshake"
+    print(f"Mode: {mode.upper()} ({kind}, {(time.perf_counter() - start) * 1000:.2f} ms)")
 
     # === Encrypt File Content ===
+    # Every file gets its own encrypted filename and IVs under the one key
+    if file_input and pipelined:
+        for path in paths or file_paths:
+            send_filename(s, cipher, mode, path)
+            send_file_pipelined(s, cipher, mode, path)
+        s.close()
+        return
+    pending = list(paths or file_paths)
     if not file_input:
+        send_filename(s, cipher, mode, file_path)
         print("Type 'kill' to exit")
     while True:
         if file_input:
-            with open(file_path, "rb") as f:
+            if not pending:
+                break
+            path = pending.pop(0)
+            send_filename(s, cipher, mode, path)
+            with open(path, "rb") as f:
                 input_bytes = f.read()
         else:
             
@@ -83,41 +123,21 @@ def start_alice():
             aes.print_inf(BitVector(textstring = input_text))
         else:
             print("Encrypting file ...")
-        pad_len = 16 - (len(input_bytes) % 16)
-        input_bytes += bytes([pad_len] * pad_len)
-        if not file_input:
+        if not file_input and mode == "cbc":
             print("After Padding:")
-            aes.print_inf(BitVector(rawbytes=input_bytes))
-
-        iv_int = Crypto.Util.number.getRandomNBitInteger(128)
-        iv = BitVector(intVal=iv_int, size=128)
-        iv_reset = iv.deep_copy()
-
-        ciphertext = BitVector(size=0)
-        chunks = math.ceil(len(input_bytes) / 16) 
-
-        for i in range(chunks):
-            block = input_bytes[i*16:(i+1)*16]
-            bv_block = BitVector(rawbytes=block) ^ iv
-            state = aes.create_matrix(bv_block)
-            state = aes.xor_round_key(state, aes.create_matrix(round_keys[0]))
-            for rnd in range(10):
-                state = aes.encrypte(state, aes.create_matrix(round_keys[rnd+1]), rnd)
-            out_block = aes.create_bitvector(state)
-            ciphertext += out_block
-            iv = out_block
+            aes.print_inf(BitVector(rawbytes=stream.pkcs7_pad(input_bytes)))
 
-        final_packet = iv_reset + ciphertext 
+        final_packet = stream.encrypt_packet(cipher, mode, input_bytes, b"data")
         if not file_input:
             print("Ciphertext:")
-            aes.print_inf(final_packet, hex_first=True)
+            aes.print_inf(BitVector(rawbytes=final_packet), hex_first=True)
         else:
             print("Encrypted file content and sent!")
 
-        s.sendall(final_packet.get_bitvector_in_ascii().encode())
-        if(file_input): 
-            break;
+        # DATA frames of frames.chunk_size, closed by END
+        frames.send_stream(s, final_packet)
     s.close()   
 
 if __name__ == "__main__":
-    start_alice() 
\ No newline at end of file
+    # python 2005089_sender.py [file ...]
+    start_alice(sys.argv[1:]) 
\ No newline at end of file
@@ -0,0 +1,169 @@
+import hashlib
+import hmac
+import importlib
+import json
+import os
+import struct
+import time
+
+aes = importlib.import_module('2005089_aes_defs')
+stream = importlib.import_module('2005089_aes_stream')
+
+# Session resumption. After a full ECDH handshake the receiver sends a ticket:
+# the session's resumption secret and mode, sealed with AES-GCM under a key
+# only the receiver holds. A later connection presents the ticket with a fresh
+# client random, the receiver answers with a server random, and both sides
+# derive the connection key from the secret and both randoms. No scalar
+# multiplication is needed, and no two connections share a key.
+#
+#   TICKET (receiver, right after the handshake reply): expiry (8) || ticket,
+#                                                       empty if none is issued
+#   RESUME (sender, instead of the offer):              client random (16) || ticket
+#   RESUME (receiver):                                  server random (16), empty
+#                                                       to refuse; a full offer follows
+
+here = os.path.dirname(os.path.abspath(__file__))
+ticket_cache_path = os.path.join(here, "2005089_session_cache.json")  # sender side
+ticket_key_path = os.path.join(here, "2005089_ticket_key.bin")  # receiver side
+ticket_lifetime = 3600  # seconds
+random_size = 16
+expiry_header = struct.Struct(">Q")
+
+def resumption_secret(key):
+    return hmac.new(key, b"resumption", hashlib.sha256).digest()[:16]
+
+def connection_key(secret, client_random, server_random):
+    return hmac.new(secret, b"connection" + client_random + server_random, hashlib.sha256).digest()[:16]
+
+# Files holding keys or secrets are only readable by their owner
+def write_private(path, data):
+    tmp = path + ".tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+# ---- receiver side ----
+
+class TicketIssuer:
+    def __init__(self, key=None, lifetime=ticket_lifetime):
+        self.cipher = aes.AES(key or os.urandom(16), "ttable")
+        self.lifetime = lifetime
+
+    # Tickets from earlier runs stay valid while the key file is kept
+    @classmethod
+    def from_file(cls, path=ticket_key_path, lifetime=ticket_lifetime):
+        try:
+            with open(path, "rb") as f:
+                key = f.read()
+            if len(key) == 16:
+                return cls(key, lifetime)
+        except OSError:
+            pass
+        key = os.urandom(16)
+        write_private(path, key)
+        return cls(key, lifetime)
+
+    # TICKET frame payload for a session established with `key`
+    def issue(self, key, mode):
+        expiry = expiry_header.pack(int(time.time()) + self.lifetime)
+        body = expiry + resumption_secret(key) + mode.encode('ascii')
+        return expiry + stream.encrypt_packet(self.cipher, "gcm", body, b"ticket")
+
+    # (secret, mode), or None for a forged, corrupt or expired ticket
+    def redeem(self, ticket):
+        try:
+            body = stream.decrypt_packet(self.cipher, "gcm", ticket, b"ticket")
+        except ValueError:
+            return None
+        if len(body) <= expiry_header.size + 16 or expiry_header.unpack_from(body)[0] < time.time():
+            return None
+        return body[8:24], body[24:].decode('ascii')
+
+    # RESUME reply and (connection key, mode); an empty reply refuses
+    def accept(self, payload, accepted_modes):
+        client_random, ticket = payload[:random_size], payload[random_size:]
+        session = self.redeem(ticket) if len(client_random) == random_size else None
+        if session is None or session[1] not in accepted_modes:
+            return b"", None, None
+        server_random = os.urandom(random_size)
+        return server_random, connection_key(session[0], client_random, server_random), session[1]
+
+# ---- sender side: tickets cached per receiver address ----
+
+def load_cache(path):
+    try:
+        with open(path) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return cache if isinstance(cache, dict) else {}
+
+# (ticket, secret, mode) for peer, or None; a malformed entry counts as
+# missing, like a corrupt cache file
+def load_ticket(peer, path=ticket_cache_path):
+    entry = load_cache(path).get(peer)
+    try:
+        if not entry or entry["expiry"] <= time.time() or not isinstance(entry["mode"], str):
+            return None
+        return bytes.fromhex(entry["ticket"]), bytes.fromhex(entry["secret"]), entry["mode"]
+    except (KeyError, TypeError, ValueError):
+        return None
+
+def save_ticket(peer, payload, key, mode, path=ticket_cache_path):
+    cache = load_cache(path)
+    if payload:
+        cache[peer] = {
+            "expiry": expiry_header.unpack_from(payload)[0],
+            "ticket": payload[expiry_header.size:].hex(),
+            "secret": resumption_secret(key).hex(),
+            "mode": mode,
+        }
+    else:
+        cache.pop(peer, None)
+    write_private(path, json.dumps(cache).encode())
+
+def drop_ticket(peer, path=ticket_cache_path):
+    save_ticket(peer, b"", None, None, path)
+
+# RESUME payload and the client random to derive the key with later
+def resume_request(ticket):
+    client_random = os.urandom(random_size)
+    return client_random, client_random + ticket
+
+def self_check():
+    issuer = TicketIssuer(lifetime=60)
+    key = os.urandom(16)
+    payload = issuer.issue(key, "gcm")
+    client_random, request = resume_request(payload[8:])
+    reply, server_key, mode = issuer.accept(request, ["gcm", "cbc"])
+    if mode != "gcm" or server_key != connection_key(resumption_secret(key), client_random, reply):
+        return False
+    # A different connection gets a different key
+    if issuer.accept(resume_request(payload[8:])[1], ["gcm"])[1] == server_key:
+        return False
+    # Malformed cache entries are skipped, not fatal
+    import tempfile
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "cache.json")
+        for entry in ({"ticket": "00"}, {"expiry": 1 << 40, "ticket": "zz", "secret": "00", "mode": "gcm"},
+                      {"expiry": "soon"}, {"expiry": 1 << 40, "ticket": "00", "secret": "00", "mode": 5}, [1, 2]):
+            with open(path, "w") as f:
+                json.dump({"peer": entry}, f)
+            if load_ticket("peer", path) is not None:
+                return False
+        with open(path, "w") as f:
+            json.dump([1, 2], f)
+        if load_ticket("peer", path) is not None:
+            return False
+    # Tampered, foreign, expired tickets and refused modes are all turned down
+    bad = bytearray(request)
+    bad[-1] ^= 1
+    expired = TicketIssuer(issuer.cipher.key, lifetime=-1).issue(key, "gcm")[8:]
+    return (issuer.accept(bytes(bad), ["gcm"])[1] is None
+            and TicketIssuer().accept(request, ["gcm"])[1] is None
+            and issuer.accept(resume_request(expired)[1], ["gcm"])[1] is None
+            and issuer.accept(request, ["cbc"])[1] is None)
+
+if __name__ == "__main__":
+    print("Tickets resume sessions and refuse bad ones:", self_check())
@@ -4,13 +4,20 @@ from prettytable import PrettyTable
 import Crypto.Util.number
 
 ecc = importlib.import_module("2005089_ecdh_defs")
+# "affine" in either runs the reference point arithmetic
+base_method = ecc.fixed_base_method  # public keys: comb table of g, built once per curve
+# Every iteration uses a fresh curve, so the table is built (and timed) on
+# its own before Alice and Bob, who then both use it
+shared_method = ecc.shared_method  # shared secret is x only: Montgomery ladder
 
 key_sizes = [128, 192, 256]
+table_times = [0, 0, 0]
 alice_times = [0, 0, 0]
 bob_times = [0, 0, 0]
 shared_times = [0, 0, 0]
 
 print("=== Elliptic Curve Diffie-Hellman (ECDH) ===")
+print("Public keys:", base_method, "/ shared secret:", shared_method)
 
 for i, key_bits in enumerate(key_sizes):
     print(f"\n--- Key Size: {key_bits} bits ---")
@@ -18,25 +25,37 @@ for i, key_bits in enumerate(key_sizes):
         print(f"--- Iteration {j + 1} ---")
         a, b, g, p = ecc.generate_curve_params(key_bits)
 
-        # Alice's keys
+        # Table for g (comb / w-NAF; nothing for the other methods)
+        start = time.time()
+        ecc.precompute(g, a, p, base_method)
+        table_times[i] += time.time() - start
+
+        # Alice's keys (left in Jacobian form until both are known)
         start = time.time()
         ka = Crypto.Util.number.getRandomNBitInteger(key_bits)
         # print(len(str(abs(ka))))
-        alice_public = ecc.ecc_scalar_mult(ka, g, a, p)
+        alice_point = ecc.scalar_mult_jacobian(ka, g, a, p, base_method)
         alice_times[i] += time.time() - start
-        print("Alice's Public Key:", alice_public)
 
         # Bob's keys
         start = time.time()
         kb = Crypto.Util.number.getRandomNBitInteger(key_bits)
-        bob_public = ecc.ecc_scalar_mult(kb, g, a, p)
+        bob_point = ecc.scalar_mult_jacobian(kb, g, a, p, base_method)
         bob_times[i] += time.time() - start
+
+        # One batched inversion normalises both public keys; split the cost
+        start = time.time()
+        alice_public, bob_public = ecc.normalize([alice_point, bob_point], p)
+        elapsed = time.time() - start
+        alice_times[i] += elapsed / 2
+        bob_times[i] += elapsed / 2
+        print("Alice's Public Key:", alice_public)
         print("\nBob's Public Key:", bob_public)
 
         # Shared key
         start = time.time()
-        shared_by_alice = ecc.ecc_scalar_mult(ka, bob_public, a, p)
-        shared_by_bob = ecc.ecc_scalar_mult(kb, alice_public, a, p)
+        shared_by_alice = ecc.shared_x(ka, bob_public, a, p, shared_method)
+        shared_by_bob = ecc.shared_x(kb, alice_public, a, p, shared_method)
         shared_times[i] += time.time() - start
 
         print("\nShared Key (Alice):", shared_by_alice)
@@ -45,11 +64,12 @@ for i, key_bits in enumerate(key_sizes):
 
 # Display timing results
 table = PrettyTable()
-table.field_names = ["Key Size (bits)", "Alice (ms)", "Bob (ms)", "Shared Key R (ms)"]
+table.field_names = ["Key Size (bits)", "Table (ms)", "Alice (ms)", "Bob (ms)", "Shared Key R (ms)"]
 
 for i in range(3):
     table.add_row([
         key_sizes[i],
+        round(table_times[i] * 1000 / 5, 4),
         round(alice_times[i] * 1000 / 5, 4),
         round(bob_times[i] * 1000 / 5, 4),
         round(shared_times[i] * 1000 / 5, 4)